@@ -0,0 +1,297 @@
+"""
+Benchmarks of the hot paths of tabsus over the test resources: CNV parsing, CNV lookups (by strategy), DBF
+reading, DEF parsing and DataFrame transformations over synthetic record sets of increasing size.
+
+The results are written as JSON, so runs of different commits can be compared:
+
+    python benchmarks/benchmark.py -o before.json
+    python benchmarks/benchmark.py -o after.json --compare before.json
+
+With --compare, the benchmarks whose median time increased by more than --threshold are reported as regressions
+and the exit status is 1.
+"""
+import argparse
+import datetime
+import fnmatch
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy
+import pandas
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tabsus
+from tabsus import TEST_RESOURCE_DIR
+from tabsus.conversion.cnv import CnvParser
+from tabsus.conversion.cnv.lookup import CnvLinearLookup
+from tabsus.conversion.dbf import DbfReader
+from tabsus.dataframe import DataFrameWrapper
+from tabsus.definition.parser import DefParser
+from tabsus.wrapper import TabSus
+
+SIH_DIR = os.path.join(TEST_RESOURCE_DIR, 'SIH')
+SCALES = [10 ** 4, 10 ** 5, 10 ** 6]
+
+# Variables of RD2008.DEF transformed by the DataFrame benchmarks: exact codes, dense codes, ranges, and ages
+TRANSFORM_VARIABLES = ['Sexo', 'Município internação', 'Faixa etária (9)', 'Idade detalhada',
+                       'Ano/Mês processamento']
+
+# Single lookups are measured over a sample of this many codes (a tenth of it for the linear lookup)
+LOOKUP_SAMPLE = 10 ** 4
+
+
+def measure(fn, repeat):
+    """Runs fn once to warm up and then repeat times, returning the time of each run"""
+    fn()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def result(name, params, n, unit, times):
+    median = statistics.median(times)
+    return {
+        'name': name,
+        'params': params,
+        'n': n,
+        'unit': unit,
+        'median_s': median,
+        'min_s': min(times),
+        'per_second': n / median if median else None
+    }
+
+
+def read_files(directory, pattern):
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        if fnmatch.fnmatch(name.lower(), pattern):
+            with open(os.path.join(directory, name), 'rb') as file:
+                files[name] = file.read()
+
+    return files
+
+
+def bench_cnv_parse(args):
+    files = read_files(os.path.join(SIH_DIR, 'CNV'), '*.cnv')
+
+    def parse():
+        for name, contents in files.items():
+            CnvParser(io.BytesIO(contents), name, tabsus.DEFAULT_ENCODING).parse()
+
+    times = measure(parse, args.repeat)
+    yield result('cnv_parse', {'files': len(files)}, sum(len(c) for c in files.values()), 'bytes', times)
+
+
+def _strategy_files():
+    """Returns the CNV file with most categories for each lookup strategy"""
+    files = {}
+    for name, contents in read_files(os.path.join(SIH_DIR, 'CNV'), '*.cnv').items():
+        try:
+            cnv = CnvParser(io.BytesIO(contents), name, tabsus.DEFAULT_ENCODING).parse()
+        except Exception:
+            continue
+
+        strategy = type(cnv.lookup).__name__
+        if strategy not in files or len(cnv.categories) > len(files[strategy].categories):
+            files[strategy] = cnv
+
+    # The linear lookup is not chosen by the parser anymore, it is measured over the file with ranges for reference
+    if 'CnvRangeTree' in files:
+        files['CnvLinearLookup'] = files['CnvRangeTree']
+
+    return files
+
+
+def _sample_codes(cnv, n, rng, misses=True):
+    """Codes of the categories of cnv (and 1% of codes without a category, unless misses is False), n in total"""
+    values = sorted({value.start for category in cnv.categories for value in category.values} - {''})
+    codes = numpy.array(values, dtype=str)[rng.integers(0, len(values), n)]
+    if misses:
+        codes[rng.random(n) < 0.01] = 'X' * cnv.length
+    return codes
+
+
+def bench_lookup(args):
+    rng = numpy.random.default_rng(0)
+
+    for strategy, cnv in _strategy_files().items():
+        linear = strategy == 'CnvLinearLookup'
+        lookup = CnvLinearLookup(cnv) if linear else cnv.lookup
+        params = {'strategy': strategy, 'file': cnv.name}
+
+        # numeric (F) files only accept numbers
+        misses = strategy != 'CnvBinarySearchRange'
+        codes = _sample_codes(cnv, LOOKUP_SAMPLE // 10 if linear else LOOKUP_SAMPLE, rng, misses).tolist()
+
+        def lookup_each():
+            for code in codes:
+                lookup[code]
+
+        times = measure(lookup_each, args.repeat)
+        yield result('lookup_single', params, len(codes), 'lookups', times)
+
+        # lookup_many() of the files always uses the strategy chosen by the parser
+        for scale in args.scales if not linear else []:
+            many = _sample_codes(cnv, scale, rng, misses)
+            times = measure(lambda: cnv.lookup_many(None, many), args.repeat)
+            yield result('lookup_many', dict(params, rows=scale), scale, 'rows', times)
+
+
+def bench_dbf_read(args):
+    for name in ['sample.dbf', 'teste.dbf']:
+        with open(os.path.join(TEST_RESOURCE_DIR, name), 'rb') as file:
+            contents = file.read()
+
+        counts = []
+
+        def read():
+            counts.append(sum(1 for _ in DbfReader(io.BytesIO(contents), tabsus.DEFAULT_ENCODING, load=False)))
+
+        times = measure(read, args.repeat)
+        yield result('dbf_read', {'file': name}, counts[-1], 'records', times)
+
+
+def bench_def_parse(args):
+    files = read_files(SIH_DIR, '*.def')
+
+    def parse():
+        for name, contents in files.items():
+            DefParser(io.StringIO(contents.decode(tabsus.DEFAULT_ENCODING)), name).parse()
+
+    times = measure(parse, args.repeat)
+    yield result('def_parse', {'files': len(files)}, len(files), 'files', times)
+
+
+def synthetic_records(n, rng):
+    """n records sampled (with replacement) from the SIH records of sample.dbf"""
+    with open(os.path.join(TEST_RESOURCE_DIR, 'sample.dbf'), 'rb') as file:
+        records = pandas.DataFrame(DbfReader(file, tabsus.DEFAULT_ENCODING))
+    return records.iloc[rng.integers(0, len(records), n)].reset_index(drop=True)
+
+
+def bench_transform(args):
+    rng = numpy.random.default_rng(0)
+    rd2008 = TabSus(SIH_DIR, cache=None).load_def('RD2008.DEF')
+
+    for scale in args.scales:
+        df = synthetic_records(scale, rng)
+        wrapper = DataFrameWrapper(rd2008, df)
+
+        for variable in TRANSFORM_VARIABLES:
+            times = measure(lambda: wrapper[variable], args.repeat)
+            yield result('transform', {'variable': variable, 'rows': scale}, scale, 'rows', times)
+
+        times = measure(lambda: wrapper.transform_many(TRANSFORM_VARIABLES), args.repeat)
+        yield result('transform_many', {'variables': len(TRANSFORM_VARIABLES), 'rows': scale}, scale, 'rows', times)
+
+
+BENCHMARKS = {
+    'cnv_parse': bench_cnv_parse,
+    'lookup': bench_lookup,
+    'dbf_read': bench_dbf_read,
+    'def_parse': bench_def_parse,
+    'transform': bench_transform
+}
+
+
+def environment():
+    def git(*command):
+        try:
+            return subprocess.run(['git', *command], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine()
+    }
+
+
+def key(entry):
+    return entry['name'], json.dumps(entry['params'], sort_keys=True)
+
+
+def compare(results, baseline, threshold):
+    """Prints the change of the median time of each benchmark, returning the regressions"""
+    previous = {key(entry): entry for entry in baseline['results']}
+
+    regressions = []
+    for entry in results:
+        before = previous.get(key(entry))
+        if not before:
+            continue
+
+        ratio = entry['median_s'] / before['median_s']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(entry)
+            flag = '  REGRESSION'
+
+        print(f"{entry['name']:<16} {json.dumps(entry['params'], ensure_ascii=False):<70} {ratio:6.2f}x{flag}",
+              file=sys.stderr)
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the tabsus benchmarks, writing the results as JSON")
+    parser.add_argument('-o', '--output', help="file to write the results to (default: standard output)")
+    parser.add_argument('-b', '--benchmark', action='append', choices=list(BENCHMARKS),
+                        help="benchmark to run (may be repeated, default: all)")
+    parser.add_argument('--scales', type=lambda s: [int(float(v)) for v in s.split(',')], default=SCALES,
+                        help="comma separated numbers of rows of the synthetic data (default: 1e4,1e5,1e6)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of each benchmark (default: 3)")
+    parser.add_argument('--compare', help="results of a previous run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative increase of the median time reported as regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    # The parsers log the errors of the test files on every run
+    logging.disable(logging.ERROR)
+
+    results = []
+    for name in args.benchmark or BENCHMARKS:
+        for entry in BENCHMARKS[name](args):
+            print(f"{entry['name']:<16} {json.dumps(entry['params'], ensure_ascii=False):<70} "
+                  f"{entry['median_s'] * 1000:10.2f} ms {entry['per_second']:14,.0f} {entry['unit']}/s",
+                  file=sys.stderr)
+            results.append(entry)
+
+    output = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(output, file, indent=2, ensure_ascii=False)
+    else:
+        json.dump(output, sys.stdout, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,74 @@
+import importlib
+import importlib.abc
+import importlib.util
 import os
+import sys
 
 TEST_RESOURCE_DIR = os.path.join(os.path.dirname(__file__), '../../tests/resources')
 DEFAULT_ENCODING = 'Windows-1252'
 
 DOWNLOAD_PATH = os.environ.get('TABSUS_HOME') or os.path.join(os.environ.get('HOME'), ".local/share/tabsus/")
 
-from .wrapper import *
-from tabsus.dataframe import *
+# Public names, imported from their modules when first used, so that tools that only parse DEF/CNV files don't
+# load pandas and the other dependencies of the DataFrame integration
+_LAZY_ATTRIBUTES = {
+    'open_def': 'tabsus.wrapper',
+    'TabSus': 'tabsus.wrapper',
+    'Database': 'tabsus.wrapper',
+    'DATABASES': 'tabsus.wrapper',
+    'load_tab': 'tabsus.wrapper',
+    'TabSusAccessor': 'tabsus.dataframe',
+    'DataFrameWrapper': 'tabsus.dataframe',
+    'DataFrameAccess': 'tabsus.dataframe',
+    'DataFrameRecordAccess': 'tabsus.dataframe',
+    'DataFrameVariableAccess': 'tabsus.dataframe',
+    'DataFrameVariableWrapper': 'tabsus.dataframe',
+    'DefVariableListWrapper': 'tabsus.dataframe'
+}
+
+__all__ = ['TEST_RESOURCE_DIR', 'DEFAULT_ENCODING', 'DOWNLOAD_PATH', 'register_accessor', *_LAZY_ATTRIBUTES]
+
+
+class _PandasImportHook(importlib.abc.MetaPathFinder):
+    """Registers the DataFrame accessor right after pandas is imported"""
+
+    def find_spec(self, name, path, target=None):
+        if name != 'pandas':
+            return None
+
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            return spec
+
+        exec_module = spec.loader.exec_module
+
+        def exec_and_register(module):
+            exec_module(module)
+            importlib.import_module('tabsus.dataframe')
+
+        spec.loader.exec_module = exec_and_register
+        return spec
+
+
+def register_accessor():
+    """Registers the DataFrame accessor (df.tabsus) now if pandas is in use, or else when pandas is imported"""
+    if 'pandas' in sys.modules:
+        importlib.import_module('tabsus.dataframe')
+    elif not any(isinstance(finder, _PandasImportHook) for finder in sys.meta_path):
+        sys.meta_path.insert(0, _PandasImportHook())
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module 'tabsus' has no attribute '{name}'")
+
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    register_accessor()
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,127 @@
+import mmap
+import os
+import pickle
+import struct
+
+import nocasedict
+
+from tabsus.conversion.cache import CACHE_VERSION
+from tabsus.conversion.loader import ConversionLoader
+from tabsus.file_loader import unix_path
+
+BUNDLE_EXT = '.tabsus'
+
+MAGIC = b'TABSUS\x00'
+# Magic, version of the pickled structures and size of the index
+HEADER = struct.Struct('<7sHQ')
+
+
+def is_bundle(path):
+    """Returns whether path is a TAB bundle file, by its header"""
+    if not isinstance(path, (str, os.PathLike)) or not os.path.isfile(path):
+        return False
+
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def bundle_version(path):
+    """Returns the version of the pickled structures of the TAB bundle file path, None if it isn't a bundle"""
+    if not is_bundle(path):
+        return None
+
+    with open(path, 'rb') as file:
+        header = file.read(HEADER.size)
+
+    return HEADER.unpack(header)[1] if len(header) == HEADER.size else None
+
+
+def write_bundle(path, encoding, definitions, cnv_files):
+    """
+    Writes a TAB bundle: the parsed DEF files and conversion files of a TAB archive in a single file.
+
+    The header is followed by the pickled index (encoding, DEF files and the position of each conversion file) and
+    the conversion files, each pickled separately so that they can be unpickled only when used.
+    :param path: path of the bundle file
+    :param encoding: encoding of the archive files
+    :param definitions: dictionary mapping DEF file paths to DefFiles
+    :param cnv_files: dictionary mapping conversion file paths to ConversionFiles
+    """
+    blobs = []
+    positions = {}
+    offset = 0
+    for cnv_path, cnv_file in cnv_files.items():
+        blob = pickle.dumps(cnv_file, protocol=pickle.HIGHEST_PROTOCOL)
+        positions[unix_path(cnv_path)] = (offset, len(blob))
+        blobs.append(blob)
+        offset += len(blob)
+
+    index = pickle.dumps({
+        'encoding': encoding,
+        'definitions': dict(definitions),
+        'cnv_files': positions
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, CACHE_VERSION, len(index)))
+        file.write(index)
+        for blob in blobs:
+            file.write(blob)
+
+    os.replace(temp_path, path)
+
+
+class TabBundle:
+    """
+    Reads a TAB bundle written by write_bundle(). The file is memory-mapped and only the index is unpickled when
+    it is opened, each conversion file is unpickled on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_size = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != CACHE_VERSION:
+            self.data.close()
+
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a TAB bundle")
+        if version != CACHE_VERSION:
+            raise ValueError(f"{path} was compiled by an incompatible version (format {version}), compile it again")
+
+        index = pickle.loads(self.data[HEADER.size:HEADER.size + index_size])
+        self.encoding = index['encoding']
+        self.definitions = nocasedict.NocaseDict(index['definitions'])
+        self.cnv_positions = nocasedict.NocaseDict(index['cnv_files'])
+        self.data_offset = HEADER.size + index_size
+
+    def __contains__(self, path):
+        return unix_path(path) in self.cnv_positions
+
+    def load_cnv(self, path):
+        """Unpickles the conversion file of path"""
+        path = unix_path(path)
+        if path not in self.cnv_positions:
+            raise FileNotFoundError(f"File '{path}' is not in the bundle {self.path}")
+
+        offset, size = self.cnv_positions[path]
+        start = self.data_offset + offset
+        return pickle.loads(self.data[start:start + size])
+
+    def close(self):
+        self.data.close()
+
+
+class BundleConversionLoader(ConversionLoader):
+    """ConversionLoader reading the conversion files of a TAB bundle"""
+
+    def __init__(self, bundle, encoding=None, max_entries=None, max_bytes=None):
+        super().__init__(None, encoding or bundle.encoding, max_entries=max_entries, max_bytes=max_bytes)
+        self.bundle = bundle
+
+    def load(self, path, encoding=None, fields=None):
+        return self.bundle.load_cnv(path)
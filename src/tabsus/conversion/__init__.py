@@ -1,3 +1,38 @@
+import numpy
+
+
+def lookup_unique(codes, lookup):
+    """
+    Looks up only the distinct codes, returning the result for each code
+    :param codes: array-like of codes, missing values (None/NaN) are looked up as empty strings
+    :param lookup: function mapping an array of distinct codes (str) to an array of results
+    """
+    import pandas
+
+    positions, uniques = pandas.factorize(numpy.asarray(codes, dtype=object))
+    uniques = numpy.append(numpy.asarray(uniques, dtype=str), '')
+    return numpy.asarray(lookup(uniques))[positions]
+
+
+def sort_key(category):
+    """Sorts categories by their order in the conversion file (by description when they have no order)"""
+    order = getattr(category, 'order', None)
+    return int(order) if order else category.description
+
+
+def category_order(categories):
+    """
+    Returns the distinct descriptions of categories sorted by order and the position of the description of each
+    category, e.g. to build a pandas.Categorical from the category positions returned by lookup_many()
+    """
+    descriptions = {}
+    for category in sorted(categories, key=sort_key):
+        descriptions.setdefault(category.description, len(descriptions))
+
+    codes = numpy.array([descriptions[c.description] for c in categories], dtype=numpy.int32)
+    return list(descriptions.keys()), codes
+
+
 class RecordAccess:
     """
     Abstract access to records, enabling to use different kinds of records/record sources
@@ -39,6 +74,22 @@ class RecordAccess:
         """
         pass
 
+    def categorize(self, value, dimension, cnv_file):
+        """
+        Converts value to the description of its category in cnv_file. Data structures with many values (e.g.
+        dataseries) may convert them all at once.
+        :param value: value returned by one of extract*() methods
+        :param dimension: a DefDimension defining the conversion variable
+        :param cnv_file: the ConversionFile of dimension
+        :return: the category description (None if value doesn't match any category)
+        """
+
+        def map_to_category(v):
+            category = cnv_file.find_category(dimension, v)
+            return category.description if category else None
+
+        return self.map(value, map_to_category)
+
 
 class Category:
     """
@@ -127,3 +178,28 @@ class ConversionFile:
         :return: list of categories
         """
         pass
+
+    def get_category_order(self, dimension):
+        """
+        Returns category_order(get_categories(dimension)): the distinct descriptions sorted by order and the position
+        of the description of each category
+        :param dimension: a DefDimension
+        """
+        return category_order(self.get_categories(dimension))
+
+    def lookup_many(self, dimension, codes):
+        """
+        Returns the position in get_categories(dimension) of the category of each code, like find_category().
+        Only the distinct codes are looked up, so this is much faster than find_category() for many codes.
+        :param dimension: a DefDimension defining the conversion variable
+        :param codes: array-like of codes
+        :return: numpy array with the category position of each code, -1 if it doesn't match any category
+        """
+        categories = self.get_categories(dimension)
+        positions = {c.description: i for i, c in reversed(list(enumerate(categories)))}
+
+        def lookup(values):
+            result = [self.find_category(dimension, v) for v in values.tolist()]
+            return numpy.array([positions.get(c.description, -1) if c else -1 for c in result], dtype=numpy.int32)
+
+        return lookup_unique(codes, lookup)
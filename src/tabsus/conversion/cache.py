@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+import tabsus
+
+# Version of the cached structures, changing it invalidates the existing entries. It must be increased whenever the
+# classes returned by the parsers change.
+CACHE_VERSION = 10
+
+
+class ConversionCache:
+    """
+    Persistent cache of parsed conversion files (CNV/DBF), so that they don't have to be parsed again by each process.
+
+    The entries are pickled conversion files, stored in a directory (by default under tabsus.DOWNLOAD_PATH) and
+    keyed by the fingerprint of the source resource (path, size and modification time/CRC) and the encoding, so an
+    entry is not used anymore if the source file changes. Resources without a fingerprint are not cached.
+
+    The name of an entry starts with a hash of the resource identity (its path), so the entries superseded by a
+    newer version of the resource (or of CACHE_VERSION) are removed when it is stored.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(tabsus.DOWNLOAD_PATH, 'cache')
+
+    def path(self, resource, encoding):
+        """Returns the path of the entry of resource, or None if it can't be cached"""
+        identity = resource.identity()
+        fingerprint = resource.fingerprint()
+        if not identity or not fingerprint:
+            return None
+
+        key = hashlib.sha1(f"{CACHE_VERSION}|{fingerprint}|{encoding}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{self._prefix(identity, encoding)}.{key}.pickle")
+
+    @staticmethod
+    def _prefix(identity, encoding):
+        return hashlib.sha1(f"{identity}|{encoding}".encode('utf-8')).hexdigest()[:16]
+
+    def get(self, resource, encoding):
+        """Returns the cached conversion file of resource, or None if it is not cached"""
+        path = self.path(resource, encoding)
+        if not path or not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except Exception as e:
+            logging.warning(f"Ignoring invalid cache entry {path} of {resource}: {e}")
+            return None
+
+    def put(self, resource, encoding, cnv_file):
+        """Stores the conversion file parsed from resource"""
+        path = self.path(resource, encoding)
+        if not path:
+            return
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            # Written to a temporary file and renamed, so that concurrent processes never read a partial entry
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    pickle.dump(cnv_file, file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+            self._prune(path)
+        except OSError as e:
+            logging.warning(f"Unable to cache {resource} in {path}: {e}")
+
+    def _prune(self, path):
+        """Removes the entries of the same resource as path (and the entries named by older versions)"""
+        prefix = os.path.basename(path).split('.')[0]
+        for name in os.listdir(self.directory):
+            parts = name.split('.')
+            stale = parts[0] == prefix or len(parts) == 2
+            if name.endswith('.pickle') and stale and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Removes all entries"""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.pickle'):
+                    os.remove(os.path.join(self.directory, name))
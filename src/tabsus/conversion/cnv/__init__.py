@@ -1,4 +1,9 @@
-from tabsus.conversion import ConversionFile, Category
+import logging
+from types import SimpleNamespace
+
+import numpy
+
+from tabsus.conversion import ConversionFile, Category, lookup_unique, category_order
 
 
 class CnvConversionFile(ConversionFile):
@@ -7,9 +12,17 @@ class CnvConversionFile(ConversionFile):
         self.description = description
         self.n_lines = n_lines
         self.length = length
-        self.categories = [c for c in categories if c and not c.subtotal]
+        self.lines = [c for c in categories if c]
+        self.categories = [c for c in self.lines if not c.subtotal]
         self.empty = ([c for c in categories if c and c.has_empty] or [None])[0]
         self.lookup = lookup_method(self)
+        self.category_order = None
+
+        # Lines with a subtotal (e.g. the UFs below the region lines of REGUF.CNV) map to the line of their
+        # subtotal. They are looked up by the detail lookup, over the lines without lines below them, built when first
+        # used with the same strategy as the lookup
+        self.subtotals = self.find_subtotals()
+        self.detail_lookup = None
 
     def extract_value(self, def_var, record_access, record):
         return record_access.extract_range(record, def_var.field, def_var.start, self.length)
@@ -17,9 +30,52 @@ class CnvConversionFile(ConversionFile):
     def find_category(self, dimension, value):
         return self.lookup[value] if value else self.empty
 
+    def find_detail(self, dimension, value):
+        """Returns the most detailed line matching value, a line with subtotal or one of the categories"""
+        if not value or not self.subtotals:
+            return self.find_category(dimension, value)
+
+        if self.detail_lookup is None:
+            parents = set(self.subtotals.values())
+            details = [c for c in self.lines if c not in parents]
+            self.detail_lookup = type(self.lookup)(SimpleNamespace(categories=details, length=self.length))
+
+        return self.detail_lookup[value] or self.lookup[value]
+
+    def find_subtotals(self):
+        """Returns a dictionary mapping each line with subtotal to the line of the subtotal, which must precede it"""
+        positions = {int(c.order): i for i, c in reversed(list(enumerate(self.lines)))}
+
+        subtotals = {}
+        for i, line in enumerate(self.lines):
+            if line.subtotal:
+                position = positions.get(int(line.subtotal)) if line.subtotal.isdigit() else None
+                if position is None or position >= i:
+                    logging.warning(f"Invalid subtotal {line.subtotal} of category {line.order} in {self.name}")
+                    continue
+
+                subtotals[line] = self.lines[position]
+
+        return subtotals
+
     def get_categories(self, dimension):
         return self.categories
 
+    def get_category_order(self, dimension):
+        if self.category_order is None:
+            self.category_order = category_order(self.categories)
+
+        return self.category_order
+
+    def lookup_many(self, dimension, codes):
+        empty = self.categories.index(self.empty) if self.empty in self.categories else -1
+
+        def lookup(values):
+            result = self.lookup.lookup_many(values)
+            return numpy.where(values == '', empty, result)
+
+        return lookup_unique(codes, lookup)
+
 
 class CnvCategory(Category):
     def __init__(self, subtotal, order, description, values):
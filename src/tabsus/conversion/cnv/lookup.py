@@ -1,61 +1,149 @@
+import numpy
+
+# The lookups store the position of each category in cnv.categories. __getitem__ returns the category of a single
+# value, lookup_many() the positions of the categories of an array of (distinct) values, -1 for values without one.
+
+
+def _lookup_each(lookup, values):
+    """Looks up the values one by one, for lookups without a vectorized implementation"""
+    positions = {id(c): i for i, c in enumerate(lookup.categories)}
+    result = [lookup[value] for value in values.tolist()]
+    return numpy.array([positions[id(c)] if c is not None else -1 for c in result], dtype=numpy.int32)
+
+
+def _first_by_order(categories):
+    """Yields (value, category position) of all single values, the first match being the category with the lowest order"""
+    seen = set()
+    for i, category in sorted(enumerate(categories), key=lambda it: int(it[1].order)):
+        for value in category.values:
+            if value.value not in seen:
+                seen.add(value.value)
+                yield value.value, i
+
+
+def _position_type(categories):
+    """Smallest integer type holding the positions of the categories (and -1)"""
+    return numpy.min_scalar_type(-max(len(categories), 1))
+
+
 class CnvArrayIndex:
+    """
+    Dense index of numeric codes: a table with the category position of each number up to 10 ** length, stored
+    in the smallest integer type. Used for numeric codes of up to 7 digits (e.g. municipality codes), all with the
+    length of the file, so only codes with that length are looked up (e.g. '00001' doesn't match '0001').
+    """
+
     def __init__(self, cnv):
-        self.values = [None for _ in range(10 ** cnv.length + 1)]
+        self.categories = cnv.categories
+        self.length = cnv.length
+        self.indexes = numpy.full(10 ** cnv.length, -1, dtype=_position_type(self.categories))
 
-        for category in cnv.categories:
-            for value in category.values:
-                self.values[int(value.value)] = category
+        for value, i in _first_by_order(self.categories):
+            self.indexes[int(value)] = i
 
     def __getitem__(self, value):
-        if not value.isdigit():
+        if len(value) != self.length or not value.isdigit():
             return None
 
-        index = int(value)
-        return self.values[index] if index < len(self.values) else None
+        position = self.indexes[int(value)]
+        return self.categories[position] if position >= 0 else None
+
+    def lookup_many(self, values):
+        values = numpy.asarray(values, dtype=str)
+
+        numeric = numpy.char.isdigit(values) & (numpy.char.str_len(values) == self.length)
+        result = numpy.full(len(values), -1, dtype=numpy.int32)
+        result[numeric] = self.indexes[values[numeric].astype(numpy.int64)]
+        return result
 
 
 class CnvHashIndex:
+    """
+    Index of exact codes (e.g. alphanumeric CID10 codes): a dictionary for single lookups and a pandas Index, a hash
+    table of the codes, for lookup_many() (built when first used)
+    """
+
     def __init__(self, cnv):
-        self.values = {}
+        self.categories = cnv.categories
+        self.values = dict(_first_by_order(self.categories))
 
-        for category in cnv.categories:
-            for value in category.values:
-                self.values[value.value] = category
+        self.keys = None
+        self.positions = numpy.array(list(self.values.values()), dtype=_position_type(self.categories))
 
     def __getitem__(self, value):
-        return self.values.get(value)
+        position = self.values.get(value)
+        return self.categories[position] if position is not None else None
+
+    def lookup_many(self, values):
+        if self.keys is None:
+            import pandas
+            self.keys = pandas.Index(list(self.values.keys()), dtype=object)
 
+        found = self.keys.get_indexer(numpy.asarray(values, dtype=str).astype(object))
+        return numpy.where(found >= 0, self.positions[found], -1).astype(numpy.int32)
 
-from intervaltree import IntervalTree
+
+import bisect
 
 
 class CnvRangeTree:
+    """
+    Lookup of CNV files with ranges. The ranges, which may overlap, are flattened when the index is built to disjoint
+    segments between sorted boundaries, each one assigned to the category with the lowest order containing it (the
+    first match, as in TabWin). A lookup is a single bisect of the boundaries (or searchsorted, for many values).
+    """
+
     def __init__(self, cnv):
-        self.tree = IntervalTree()
         self.categories = cnv.categories
-        self.categories.sort(key=(lambda it: -int(it.order)))
 
-        for category in self.categories:
-            for value in category.values:
-                self.tree[value] = category
+        # Half-open intervals [start, stop) of all values, by category order
+        intervals = sorted(((value.start, value.stop, int(category.order), i)
+                            for i, category in enumerate(self.categories) for value in category.values),
+                           key=lambda it: it[2])
+
+        boundaries = sorted({b for start, stop, _, _ in intervals for b in (start, stop)})
+        positions = numpy.full(len(boundaries), -1, dtype=numpy.int32)
+        for start, stop, _, i in intervals:
+            segments = positions[bisect.bisect_left(boundaries, start):bisect.bisect_left(boundaries, stop)]
+            segments[segments < 0] = i
+
+        # Merges adjacent segments of the same category
+        keep = numpy.ones(len(boundaries), dtype=bool)
+        keep[1:] = positions[1:] != positions[:-1]
+
+        self.boundaries = [b for b, k in zip(boundaries, keep) if k]
+        self.positions = positions[keep]
+        self.boundary_array = numpy.array(self.boundaries, dtype=str)
 
     def __getitem__(self, value):
-        interval = sorted(self.tree[value], key=lambda it: int(it.data.order))
-        return interval[0].data if len(interval) > 0 else None
+        segment = bisect.bisect_right(self.boundaries, value) - 1
+        position = self.positions[segment] if segment >= 0 else -1
+        return self.categories[position] if position >= 0 else None
+
+    def lookup_many(self, values):
+        values = numpy.asarray(values, dtype=str)
+        if not self.boundaries:
+            return numpy.full(len(values), -1, dtype=numpy.int32)
+
+        segments = numpy.searchsorted(self.boundary_array, values, side='right') - 1
+        return numpy.where(segments >= 0, self.positions[segments], -1).astype(numpy.int32)
 
 
 class CnvLinearLookup:
     def __init__(self, cnv):
-        self.categories = list(cnv.categories)
-        self.categories.sort(key=(lambda it: int(it.order)))
+        self.categories = cnv.categories
+        self.sorted_categories = sorted(self.categories, key=(lambda it: int(it.order)))
 
     def __getitem__(self, value):
-        for category in self.categories:
+        for category in self.sorted_categories:
             if value in category:
                 return category
 
         return None
 
+    def lookup_many(self, values):
+        return _lookup_each(self, numpy.asarray(values, dtype=str))
+
 
 from decimal import Decimal
 
@@ -74,6 +162,16 @@ class CnvBinarySearchRange:
         index = self.binary_search(numeric_value)
         return self.categories[index]
 
+    def lookup_many(self, values):
+        """Same as binary_search(): the first value not less than each value, or the last one. -1 if not numeric"""
+        import pandas
+
+        numbers = pandas.to_numeric(pandas.Series(numpy.asarray(values, dtype=str)), errors='coerce').to_numpy()
+        boundaries = numpy.array([float(v) for v in self.values])
+
+        result = numpy.minimum(numpy.searchsorted(boundaries, numbers, side='left'), len(boundaries) - 1)
+        return numpy.where(numpy.isnan(numbers), -1, result).astype(numpy.int32)
+
     def binary_search(self, value):
         result = -1
 
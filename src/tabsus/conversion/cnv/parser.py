@@ -32,6 +32,7 @@ class CnvParser:
         self.type = None
         self.lines = None
         self.line_pattern = CnvParser.LINE_PATTERN
+        self.columns = CnvParser.LINE_COLUMNS
 
         self.errors = []
         self.has_range = False
@@ -51,19 +52,31 @@ class CnvParser:
         return CnvConversionFile(self.name, self.description, self.n_lines, self.length, self.lines,
                                  self.find_lookup_strategy())
 
+    # Numeric codes use a dense index (a table with 10 ** length entries) if it has up to DENSE_INDEX_MAX_SIZE
+    # entries and up to DENSE_INDEX_MAX_SPARSENESS entries per value (small tables are always dense)
+    DENSE_INDEX_MAX_SIZE = 10 ** 7
+    DENSE_INDEX_MAX_SPARSENESS = 256
+    DENSE_INDEX_SMALL_SIZE = 1 << 16
+
     def find_lookup_strategy(self):
-        if not self.has_range:
-            if self.type[0:1] == 'F':
-                assert self.all_single_value
-                return CnvBinarySearchRange
-            elif self.type == 'L':
-                return CnvHashIndex
-            elif self.length <= 3 and self.only_numeric_values:
-                return CnvArrayIndex
-        else:
+        if self.has_range:
             return CnvRangeTree
+        elif self.type[0:1] == 'F':
+            assert self.all_single_value
+            return CnvBinarySearchRange
+        elif self.type != 'L' and self.only_numeric_values and self.is_dense():
+            return CnvArrayIndex
+
+        return CnvHashIndex
+
+    def is_dense(self):
+        size = 10 ** self.length
+        values = [v.value for c in self.lines if c for v in c.values]
+
+        if size > CnvParser.DENSE_INDEX_MAX_SIZE or any(len(v) != self.length for v in values):
+            return False
 
-        return CnvLinearLookup
+        return size <= CnvParser.DENSE_INDEX_SMALL_SIZE or size <= CnvParser.DENSE_INDEX_MAX_SPARSENESS * len(values)
 
     HEADER_PATTERN = re.compile(r'([A-Z]*)\s*([0-9]+)\s+([0-9]+)\s*([A-Z]*)')
 
@@ -81,6 +94,7 @@ class CnvParser:
 
         if self.format == 'N':
             self.line_pattern = CnvParser.LONG_LINE_PATTERN
+            self.columns = CnvParser.LONG_LINE_COLUMNS
 
     def skip_to_header(self):
         while True:
@@ -113,66 +127,90 @@ class CnvParser:
             f"Error in line {self.current_line_no}: {error}.{self.current_line}")
 
     def parse_body(self):
-        while True:
-            line = self.file.readline()
-
-            if not line:
-                break
+        # (subtotal, order, description) and the values of the lines of each order, the categories are built once all
+        # the lines are read
+        self._headings = [None] * len(self.lines)
+        self._values = [None] * len(self.lines)
 
+        for line in self.file:
             self.count_line(line)
 
-            line = line.rstrip()
-            line = line.rstrip("\x1a")
-            line = strip_comments(line)
-            if not line:
-                continue
+            line = line.rstrip().rstrip("\x1a")
+            comment = line.find(';')
+            if comment >= 0:
+                line = line[:comment]
 
-            if not re.sub(r'\\W', '', line):
+            if not line or not line.replace('\\W', ''):
                 continue
 
             self.parse_line(line)
 
+        self.lines = [CnvCategory(*heading, values) if heading else None
+                      for heading, values in zip(self._headings, self._values)]
+
     LINE_PATTERN = re.compile(r"^([\s\d]{3})([\s\d]{4})\s(.{52})([0-9A-Za-z,\.\s\-]+)")
-    LONG_LINE_PATTERN = re.compile(r"^([\s\d]{4})([\s\d]{5})\s(.{101})([0-9A-Za-z,\.\s\-]+)")
+    LONG_LINE_PATTERN = re.compile(r"^([\s\d]{4})([\s\d]{5})\s(.{102})([0-9A-Za-z,\.\s\-]+)")
 
-    def parse_line(self, line):
-        match = self.line_pattern.match(line)
+    # End of the subtotal, order and description columns of LINE_PATTERN and LONG_LINE_PATTERN, and the values
+    LINE_COLUMNS = (3, 7, 60)
+    LONG_LINE_COLUMNS = (4, 9, 112)
+    VALUES_PATTERN = re.compile(r"[0-9A-Za-z,\.\s\-]+")
 
-        if not match:
-            self.raise_exception("Invalid line")
+    def parse_line(self, line):
+        subtotal_end, order_end, description_end = self.columns
+
+        # Lines are sliced by their fixed columns. Lines that don't fit them (e.g. with tabs) are matched by the line
+        # pattern, which raises the error of invalid lines
+        match = None
+        code = line[:order_end].replace(' ', '')
+        if line[order_end:order_end + 1] == ' ' and (not code or code.isdecimal()):
+            match = CnvParser.VALUES_PATTERN.match(line, description_end)
+
+        if match:
+            subtotal = line[:subtotal_end].strip()
+            order = line[subtotal_end:order_end].strip()
+            description = line[order_end + 1:description_end].strip()
+            values = match[0]
+        else:
+            match = self.line_pattern.match(line)
+            if not match:
+                self.raise_exception("Invalid line")
 
-        subtotal = match[1].strip()
-        order = match[2].strip()
-        description = match[3].strip()
-        values = self.parse_values(match[4].rstrip())
+            subtotal = match[1].strip()
+            order = match[2].strip()
+            description = match[3].strip()
+            values = match[4]
 
-        self.add_line(subtotal, order, description, values)
+        self.add_line(subtotal, order, description, self.parse_values(values.rstrip()))
 
     def add_line(self, subtotal, order, description, values):
         index = int(order) - 1
 
-        category = self.lines[index]
-        if category is None:
-            category = CnvCategory(subtotal, order, description, values)
+        heading = self._headings[index]
+        if heading is None:
+            self._headings[index] = [subtotal, order, description]
+            self._values[index] = values
         else:
             self.all_single_value = False
 
-            if category.description != description and not subtotal:
+            if heading[2] != description and not subtotal:
                 logging.warning("Categories with the same order number but different description %s ('%s' != '%s')" %
-                                (order, category.description, description))
-
-            category = CnvCategory(category.subtotal, category.order, description, category.values + values)
+                                (order, heading[2], description))
 
-        self.lines[index] = category
+            # the category keeps the subtotal and order of its first line, and the description of the last one. As
+            # before, a blank value (e.g. '  ') of any of its lines makes it match empty values, missing values (None,
+            # e.g. of a trailing comma) never do
+            heading[2] = description
+            self._values[index] += values
 
     def parse_values(self, values):
-        return list(map(self.parse_value, values.split(',')))
+        return [self.parse_value(value) for value in values.split(',')]
 
     VALUE_PATTERN = re.compile(
         r"[0-9A-Za-z][0-9A-Za-z ]*\-[0-9A-Za-z][0-9A-Za-z ]*")
 
     def parse_value(self, value):
-        if CnvParser.VALUE_PATTERN.match(value):
+        if '-' in value and CnvParser.VALUE_PATTERN.match(value):
             self.has_range = True
             self.all_single_value = False
 
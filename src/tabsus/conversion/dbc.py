@@ -0,0 +1,307 @@
+import io
+import os
+import struct
+
+from tabsus.file_loader import Resource, FileResource
+
+
+def is_dbc(file):
+    """Returns whether file (path, Resource or file object) refers to a DBC file, by its name"""
+    if isinstance(file, Resource):
+        name = os.fspath(file) if isinstance(file, os.PathLike) else str(file)
+    elif isinstance(file, (str, os.PathLike)):
+        name = os.fspath(file)
+    else:
+        name = getattr(file, 'name', None)
+
+    return isinstance(name, str) and name.lower().endswith('.dbc')
+
+
+def open_dbc(file):
+    """
+    Opens a DBC file (path or binary file object), returning a binary file object with the decompressed DBF.
+    When datasus-dbc is installed, the file is decompressed at once in memory by it (about 60 MB/s). Otherwise, it is
+    decompressed in Python (see explode) while it is read.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        file = open(file, 'rb')
+
+    try:
+        import datasus_dbc
+    except ImportError:
+        return io.BufferedReader(DbcStream(file), buffer_size=DbcStream.CHUNK_SIZE)
+
+    with file:
+        return io.BytesIO(datasus_dbc.decompress_bytes(file.read()))
+
+
+class DbcResource(Resource):
+    """Resource decompressing a DBC resource when opened, so it can be read as a DBF file"""
+
+    def __init__(self, resource):
+        if not isinstance(resource, Resource):
+            resource = FileResource(os.fspath(resource))
+
+        self.resource = resource
+
+    def open(self):
+        return open_dbc(self.resource.open())
+
+    def identity(self):
+        return self.resource.identity()
+
+    def fingerprint(self):
+        return self.resource.fingerprint()
+
+    def __str__(self):
+        return str(self.resource)
+
+
+class DbcStream(io.RawIOBase):
+    """
+    Reads a DBC file, the compressed DBF format used by DATASUS, as a DBF file.
+
+    A DBC file contains the DBF header followed by a CRC32 (4 bytes) and the records compressed with the
+    PKWare Data Compression Library "implode" method. The records are decompressed on demand as they are read.
+    """
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, infile):
+        super().__init__()
+        self.infile = infile
+
+        header = infile.read(10)
+        if len(header) < 10:
+            raise ValueError("Invalid DBC file: incomplete header")
+
+        header_length = struct.unpack('<H', header[8:10])[0]
+        header += infile.read(header_length - len(header))
+        infile.read(4)  # CRC32
+
+        self._chunks = explode(infile.read, DbcStream.CHUNK_SIZE)
+        self._buffer = memoryview(header)
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._offset >= len(self._buffer):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+
+            self._buffer = memoryview(chunk)
+            self._offset = 0
+
+        n = min(len(b), len(self._buffer) - self._offset)
+        b[:n] = self._buffer[self._offset:self._offset + n]
+        self._offset += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.infile.close()
+        super().close()
+
+
+# Huffman code lengths, base lengths and extra bits of PKWare DCL. See blast.c by Mark Adler (zlib contrib/blast).
+_LITERAL_LENGTHS = bytes([
+    11, 124, 8, 7, 28, 7, 188, 13, 76, 4, 10, 8, 12, 10, 12, 10, 8, 23, 8,
+    9, 7, 6, 7, 8, 7, 6, 55, 8, 23, 24, 12, 11, 7, 9, 11, 12, 6, 7, 22, 5,
+    7, 24, 6, 11, 9, 6, 7, 22, 7, 11, 38, 7, 9, 8, 25, 11, 8, 11, 9, 12,
+    8, 12, 5, 38, 5, 38, 5, 11, 7, 5, 6, 21, 6, 10, 53, 8, 7, 24, 10, 27,
+    44, 253, 253, 253, 252, 252, 252, 13, 12, 45, 12, 45, 12, 61, 12, 45,
+    44, 173])
+_LENGTH_LENGTHS = bytes([2, 35, 36, 53, 38, 23])
+_DISTANCE_LENGTHS = bytes([2, 20, 53, 230, 247, 151, 248])
+
+_LENGTH_BASE = (3, 2, 4, 5, 6, 7, 8, 9, 10, 12, 16, 24, 40, 72, 136, 264)
+_LENGTH_EXTRA = (0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8)
+
+_END_LENGTH = 519
+_WINDOW_SIZE = 4096
+
+
+def code_lengths(compact):
+    """Expands the compact representation (4 bits repeat count, 4 bits length) to the code length of each symbol"""
+    lengths = []
+    for value in compact:
+        lengths += [value & 15] * ((value >> 4) + 1)
+
+    return lengths
+
+
+def canonical_codes(lengths):
+    """Returns (code, length) of each symbol of the canonical Huffman code with the given code lengths"""
+    codes = [None] * len(lengths)
+
+    code = 0
+    for length in range(1, max(lengths) + 1):
+        for symbol, symbol_length in enumerate(lengths):
+            if symbol_length == length:
+                codes[symbol] = (code, length)
+                code += 1
+        code <<= 1
+
+    return codes
+
+
+def _decoding_table(compact):
+    """
+    Builds a table indexed by the next input bits (least significant first) with symbol << 4 | code length.
+    PKWare codes are stored most significant bit first and with the bits inverted.
+    """
+    lengths = code_lengths(compact)
+    max_length = max(lengths)
+
+    table = [0] * (1 << max_length)
+    for symbol, (code, length) in enumerate(canonical_codes(lengths)):
+        bits = 0
+        for i in range(length):
+            bits |= (((code >> (length - 1 - i)) & 1) ^ 1) << i
+
+        for suffix in range(1 << (max_length - length)):
+            table[bits | suffix << length] = symbol << 4 | length
+
+    return table, (1 << max_length) - 1
+
+
+_TABLES = {}
+
+
+def _length_table(compact):
+    """
+    Builds a table indexed by the next 15 input bits (code and extra bits) with length << 5 | bits used, so a
+    length is decoded with a single lookup.
+    """
+    lengths, mask = _decoding_table(compact)
+
+    table = [0] * (1 << 15)
+    for bits in range(len(table)):
+        entry = lengths[bits & mask]
+        symbol, used = entry >> 4, entry & 15
+        extra = _LENGTH_EXTRA[symbol]
+        table[bits] = (_LENGTH_BASE[symbol] + ((bits >> used) & ((1 << extra) - 1))) << 5 | (used + extra)
+
+    return table
+
+
+def _distance_table(compact, low_bits):
+    """
+    Builds a table indexed by the next 8 + low_bits input bits (code and low bits) with distance << 5 | bits used,
+    so a distance is decoded with a single lookup.
+    """
+    distances, mask = _decoding_table(compact)
+
+    table = [0] * (1 << (8 + low_bits))
+    for bits in range(len(table)):
+        entry = distances[bits & mask]
+        used = entry & 15
+        table[bits] = (((entry >> 4) << low_bits) + ((bits >> used) & ((1 << low_bits) - 1)) + 1) << 5 \
+            | (used + low_bits)
+
+    return table
+
+
+def _get_tables(dict_bits):
+    """Returns the literal, length, distance (length 2) and distance (other lengths) tables for dict_bits"""
+    if 'literal' not in _TABLES:
+        _TABLES['literal'] = _decoding_table(_LITERAL_LENGTHS)[0]
+        _TABLES['length'] = _length_table(_LENGTH_LENGTHS)
+        _TABLES[2] = _distance_table(_DISTANCE_LENGTHS, 2)
+
+    if dict_bits not in _TABLES:
+        _TABLES[dict_bits] = _distance_table(_DISTANCE_LENGTHS, dict_bits)
+
+    return _TABLES['literal'], _TABLES['length'], _TABLES[2], _TABLES[dict_bits]
+
+
+def explode(read, chunk_size=1 << 16):
+    """
+    Decompresses data compressed with the PKWare Data Compression Library (implode), yielding chunks of
+    decompressed bytes.
+    The lengths and distances are decoded with a single table lookup each, including their extra bits, and the input
+    is consumed 8 bytes at a time. It decompresses about 10 MB/s of DBF records in CPython 3.11.
+    :param read: function returning up to n bytes of the compressed input (e.g. file.read)
+    :param chunk_size: minimum size of the yielded chunks (except the last)
+    """
+    data = read(chunk_size)
+    if len(data) < 2:
+        raise ValueError("Invalid imploded data: incomplete header")
+
+    coded_literals, dict_bits = data[0], data[1]
+    if coded_literals > 1:
+        raise ValueError(f"Invalid imploded data: literal type {coded_literals}")
+    if not 4 <= dict_bits <= 6:
+        raise ValueError(f"Invalid imploded data: dictionary size {dict_bits}")
+
+    literals, lengths, short_distances, distances = _get_tables(dict_bits)
+    distance_mask = (1 << (8 + dict_bits)) - 1
+
+    pos = 2
+    bitbuf = 0
+    bitcnt = 0
+    out = bytearray()
+    flush_size = chunk_size + _WINDOW_SIZE
+
+    while True:
+        if bitcnt < 32:
+            if pos + 8 > len(data):
+                data = data[pos:] + read(chunk_size)
+                pos = 0
+
+            available = min(8, len(data) - pos)
+            bitbuf |= int.from_bytes(data[pos:pos + available], 'little') << bitcnt
+            bitcnt += available << 3
+            pos += available
+
+            if bitcnt <= 0:
+                raise ValueError("Invalid imploded data: unexpected end of input")
+
+        if bitbuf & 1:
+            entry = lengths[(bitbuf >> 1) & 0x7fff]
+            length = entry >> 5
+            used = 1 + (entry & 31)
+
+            if length == _END_LENGTH:
+                bitcnt -= used
+                break
+
+            bitbuf >>= used
+            if length == 2:
+                entry = short_distances[bitbuf & 0x3ff]
+            else:
+                entry = distances[bitbuf & distance_mask]
+            bitbuf >>= entry & 31
+            bitcnt -= used + (entry & 31)
+
+            distance = entry >> 5
+            start = len(out) - distance
+            if start < 0:
+                raise ValueError("Invalid imploded data: distance too far back")
+
+            if distance >= length:
+                out += out[start:start + length]
+            else:
+                out += (out[start:] * (length // distance + 1))[:length]
+        elif coded_literals:
+            entry = literals[(bitbuf >> 1) & 0x1fff]
+            out.append(entry >> 4)
+            bitbuf >>= 1 + (entry & 15)
+            bitcnt -= 1 + (entry & 15)
+        else:
+            out.append((bitbuf >> 1) & 255)
+            bitbuf >>= 9
+            bitcnt -= 9
+
+        if len(out) >= flush_size:
+            yield bytes(out[:-_WINDOW_SIZE])
+            del out[:-_WINDOW_SIZE]
+
+    if bitcnt < 0:
+        raise ValueError("Invalid imploded data: unexpected end of input")
+
+    if out:
+        yield bytes(out)
@@ -1,8 +1,19 @@
-from tabsus.conversion import Category, ConversionFile
-from tabsus.conversion import CategoryValue
+import copy
+import struct
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy
 from nocasedict import NocaseDict
 import dbfread
 
+import tabsus
+from tabsus.conversion import Category, ConversionFile, RecordAccess, lookup_unique, category_order
+from tabsus.conversion import CategoryValue
+from tabsus.conversion.dbc import DbcResource, is_dbc, open_dbc
+from tabsus.file_loader import Resource, FileResource
+
 
 class DbfCategory(Category):
     def __init__(self, value, description):
@@ -10,19 +21,63 @@ class DbfCategory(Category):
         self.description = description
 
 
+def _fold(key):
+    return key.casefold() if isinstance(key, str) else key
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 class DbfConversionFile(ConversionFile):
-    def __init__(self, name, fields, records):
+    """
+    Conversion file read from a DBF table (e.g. CID10.DBF). The table is stored by columns, each one an array of
+    the field values (repeated strings are interned, so they are stored once). Only the columns of the fields used
+    as keys and descriptions may be read. The indexes by key field, and their categories by description field, are
+    built when first used.
+    """
+
+    def __init__(self, name, fields, columns, dbf_fields=None):
+        """
+        :param name: file name
+        :param fields: names of the fields read
+        :param columns: values of each field read, in the same order as fields
+        :param dbf_fields: names of all the fields of the table, by default fields
+        """
         self.name = name
-        self.default_field = fields[0]
-        self.fields = set(fields)
-        self.records = records
+        self.dbf_fields = list(dbf_fields or fields)
+        self.default_field = self.dbf_fields[0]
+        self.columns = NocaseDict(zip(fields, columns))
         self.indexes = NocaseDict({})
 
+    def __len__(self):
+        return len(self.columns[self.default_field]) if self.columns else 0
+
+    @property
+    def fields(self):
+        return list(self.columns.keys())
+
+    @property
+    def records(self):
+        """All records as dictionaries, built on demand"""
+        return [self.record(row) for row in range(len(self))]
+
+    def has_fields(self, fields=None):
+        """Returns whether the columns of fields (by default all the fields of the table) were read"""
+        if fields is None:
+            return len(self.columns) == len(self.dbf_fields)
+
+        dbf_fields = {f.casefold() for f in self.dbf_fields}
+        return all(f in self.columns or f.casefold() not in dbf_fields for f in fields)
+
+    def record(self, row):
+        return NocaseDict((field, column[row]) for field, column in self.columns.items())
+
     def extract_value(self, def_var, record_access, record):
         return record_access.extract_field(record, def_var.field)
 
     def get_index_by(self, field):
-        if field not in self.fields:
+        if field not in self.columns:
             field = self.default_field
 
         index = self.indexes.get(field)
@@ -33,8 +88,8 @@ class DbfConversionFile(ConversionFile):
         return index
 
     def find_category(self, dimension, value):
-        record = self.find_record(dimension.field, value)
-        return DbfCategory(CategoryValue(value), record[dimension.dbf_field]) if record else None
+        row = self.get_index_by(dimension.field).row(value)
+        return DbfCategory(CategoryValue(value), self.columns[dimension.dbf_field][row]) if row is not None else None
 
     def find_record(self, field, value):
         index = self.get_index_by(field)
@@ -44,43 +99,157 @@ class DbfConversionFile(ConversionFile):
         index = self.get_index_by(dimension.field)
         return index.get_categories(dimension.dbf_field)
 
+    def get_category_order(self, dimension):
+        index = self.get_index_by(dimension.field)
+        return index.get_category_order(dimension.dbf_field)
+
+    def lookup_many(self, dimension, codes):
+        return lookup_unique(codes, self.get_index_by(dimension.field).lookup_many)
+
 
 class DbfIndex:
+    """
+    Index of a DbfConversionFile by a key field, case-insensitive: the row of each key (the last one, if the key is
+    repeated) in the order of their first occurrence. The categories of each description field are built on demand.
+    """
+
     def __init__(self, key_field, dbf_file):
         self.key_field = key_field
         self.dbf_file = dbf_file
-        self.categories = NocaseDict({c[key_field]: c for c in dbf_file.records})
+
+        self.rows = {}
+        for row, key in enumerate(dbf_file.columns[key_field].tolist()):
+            self.rows[_fold(key)] = row
+
+        self.positions = None
+        self.categories = NocaseDict()
+        self.category_orders = NocaseDict()
+
+    def row(self, key):
+        return self.rows.get(_fold(key))
 
     def __getitem__(self, key):
-        return self.categories.get(key)
+        row = self.row(key)
+        return self.dbf_file.record(row) if row is not None else None
+
+    def lookup_many(self, keys):
+        """Returns the position of each key in get_categories(), -1 if it is not in the index"""
+        if self.positions is None:
+            self.positions = {key: i for i, key in enumerate(self.rows.keys())}
+
+        get = self.positions.get
+        return numpy.array([get(_fold(key), -1) for key in keys.tolist()], dtype=numpy.int32)
 
     def __contains__(self, key):
-        return self[key]
+        return self.row(key) is not None
 
     def get_categories(self, field):
-        return [DbfCategory(key, r[field]) for key, r in self.categories.items()]
+        categories = self.categories.get(field)
+        if categories is None:
+            keys = self.dbf_file.columns[self.key_field].tolist()
+            descriptions = self.dbf_file.columns[field].tolist()
+            categories = [DbfCategory(keys[row], descriptions[row]) for row in self.rows.values()]
+            self.categories[field] = categories
+
+        return categories
+
+    def get_category_order(self, field):
+        order = self.category_orders.get(field)
+        if order is None:
+            order = category_order(self.get_categories(field))
+            self.category_orders[field] = order
+
+        return order
+
+
+def _factorize_bytes(values):
+    """
+    Factorizes an 'S' array, returning the code of each value and the distinct values. Values of up to 8 bytes are
+    hashed as integers.
+    """
+    import pandas
+
+    if values.dtype.itemsize <= 8:
+        integers = numpy.ascontiguousarray(values).astype('S8').view(numpy.uint64)
+        codes, uniques = pandas.factorize(integers)
+        return codes, numpy.asarray(uniques, dtype=numpy.uint64).view('S8')
+
+    uniques, codes = numpy.unique(values, return_inverse=True)
+    return codes.reshape(-1), uniques
+
+
+class DbfRecordAccess(RecordAccess):
+    """
+    Record access over DbfTables, extracting values straight from the raw fixed-width records: a value spanning
+    many fields is a contiguous slice of the record, so it is extracted without concatenating the fields.
+    """
+
+    def extract_range(self, table, field_name, start, length):
+        return table.decode_range(field_name, start, length)
+
+    def extract_field(self, table, field_name):
+        return table.decode(field_name)
+
+    def map(self, values, fn):
+        import pandas
+
+        codes, uniques = pandas.factorize(values)
+        mapped = [fn(v) for v in uniques]
+        if (codes < 0).any():
+            # missing values are factorized as -1, which indexes the last element
+            mapped.append(fn(None))
+
+        result = numpy.empty(len(mapped), dtype=object)
+        result[:] = mapped
+        return result[codes]
 
 
 class DbfParser:
-    def __init__(self, file, name, encoding):
+    def __init__(self, file, name, encoding, fields=None):
+        """
+        :param fields: names of the fields to be read besides the first one (the default key), None for all fields
+        """
         self.file = file
         self.name = name
         self.encoding = encoding
+        self.fields = fields
 
     def parse(self):
-        reader = DbfReader(self.file, self.encoding)
+        file = open_dbc(self.file) if is_dbc(self.name) else self.file
+        reader = DbfReader(file, self.encoding, load=False)
 
-        fields = [f.name for f in reader.fields]
-        records = [r for r in reader]
+        dbf_fields = [f.name for f in reader.fields]
+        read = {f.casefold() for f in self.fields} if self.fields is not None else None
+        positions = [i for i, name in enumerate(dbf_fields) if read is None or i == 0 or name.casefold() in read]
 
-        return DbfConversionFile(self.name, fields, records)
+        # The values of the fields read are appended to their columns as the records are streamed
+        reader.recfactory = _record_values
+        values = [[] for _ in positions]
+        for record in reader:
+            for column, i in zip(values, positions):
+                column.append(_intern(record[i]))
+
+        columns = [_column(values.pop(0)) for _ in positions]
+        return DbfConversionFile(self.name, [dbf_fields[i] for i in positions], columns, dbf_fields)
+
+
+def _record_values(items):
+    return [value for _, value in items]
+
+
+def _column(values):
+    column = numpy.empty(len(values), dtype=object)
+    column[:] = values
+    return column
 
 
 class DbfReader(dbfread.DBF):
     """Overrides dbfread.DBF to enable reading from an open file handle,
-     (e.g. compressed file, zip entry) instead of a file system file"""
+     (e.g. compressed file, zip entry) instead of a file system file.
+
+     Unless load is True the records are streamed from the file handle, and can be iterated only once."""
 
-    def __init__(self, infile, encoding):
+    def __init__(self, infile, encoding, load=True):
         self.encoding = None
         self.ignorecase = True
         self.lowernames = False
@@ -110,7 +279,8 @@ class DbfReader(dbfread.DBF):
         self.infile = infile
         self.memofilename = self._get_memofilename()
 
-        self._records = list(self._iter_records(b' '))
+        if load:
+            self._records = list(self._iter_records(b' '))
 
     def _iter_records(self, record_type=b' '):
         infile = self.infile
@@ -143,3 +313,253 @@ class DbfReader(dbfread.DBF):
                     break
                 else:
                     skip_record(infile)
+
+
+@contextmanager
+def _open_dbf(file):
+    """
+    Opens file (path, Resource or binary file object) yielding the file object and its path, if memory-mappable.
+    DBC files are decompressed while they are read.
+    """
+    if isinstance(file, FileResource):
+        file = file.file_path
+
+    if is_dbc(file):
+        if hasattr(file, 'read'):
+            yield open_dbc(file), None
+        else:
+            with DbcResource(file).open() as infile:
+                yield infile, None
+    elif isinstance(file, Resource):
+        with file.open() as infile:
+            yield infile, None
+    elif hasattr(file, 'read'):
+        yield file, None
+    else:
+        with open(file, 'rb') as infile:
+            yield infile, file
+
+
+DbfField = namedtuple('DbfField', ['name', 'type', 'offset', 'length', 'decimal_count'])
+
+
+class DbfTable:
+    """
+    Reads a DBF file as a fixed-width NumPy structured array built from the DBF header.
+
+    Files in the file system are memory-mapped, other files (e.g. zip entries, DBC files) are read in bulk. Raw field values
+    are zero-copy views of the records ('S' dtype) and are only decoded when a field is requested.
+
+    iter_chunks() reads the file in tables of a fixed number of records (at least one, possibly empty, table), so
+    files larger than the available memory can be processed.
+    """
+
+    HEADER = struct.Struct('<BBBBIHH20x')
+    FIELD = struct.Struct('<11sc4xBB14x')
+
+    CHUNK_SIZE = 100000
+
+    def __init__(self, file, encoding=tabsus.DEFAULT_ENCODING):
+        with _open_dbf(file) as (infile, path):
+            self._read_header(infile, encoding)
+
+            if path:
+                self._set_records(self._map_records(infile, path))
+            else:
+                self._skip_header(infile)
+                self._set_records(self._read_records(infile, self.n_records))
+
+    @classmethod
+    def iter_chunks(cls, file, chunk_size=None, encoding=tabsus.DEFAULT_ENCODING):
+        """Iterates the records of a DBF file in DbfTables of up to chunk_size records"""
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+
+        with _open_dbf(file) as (infile, path):
+            table = cls.__new__(cls)
+            table._read_header(infile, encoding)
+
+            if path:
+                records = table._map_records(infile, path)
+                for start in range(0, max(len(records), 1), chunk_size):
+                    yield table._chunk(records[start:start + chunk_size])
+            else:
+                table._skip_header(infile)
+                remaining = table.n_records
+                while True:
+                    records = table._read_records(infile, min(chunk_size, remaining))
+                    remaining -= len(records)
+                    yield table._chunk(records)
+
+                    if not len(records) or remaining <= 0:
+                        break
+
+    def _read_header(self, infile, encoding):
+        version, year, month, day, n_records, header_length, record_length = \
+            DbfTable.HEADER.unpack(infile.read(DbfTable.HEADER.size))
+
+        self.encoding = encoding
+        self.n_records = n_records
+        self.header_length = header_length
+        self.record_length = record_length
+        self.fields = []
+
+        offset = 1  # deletion flag
+        self._header_read = DbfTable.HEADER.size
+        while self._header_read + DbfTable.FIELD.size <= header_length:
+            data = infile.read(DbfTable.FIELD.size)
+            self._header_read += len(data)
+            if not data or data[0:1] == b'\r':
+                break
+
+            name, field_type, length, decimal_count = DbfTable.FIELD.unpack(data)
+            name = name.split(b'\0')[0].decode('ascii').strip()
+            self.fields.append(DbfField(name, field_type.decode('ascii'), offset, length, decimal_count))
+            offset += length
+
+        self.field_names = [f.name for f in self.fields]
+        self._fields = NocaseDict({f.name: f for f in self.fields})
+
+        self.dtype = numpy.dtype({
+            'names': ['_deleted'] + self.field_names,
+            'formats': ['S1'] + [f'S{f.length}' for f in self.fields],
+            'offsets': [0] + [f.offset for f in self.fields],
+            'itemsize': record_length
+        })
+
+    def _skip_header(self, infile):
+        infile.read(self.header_length - self._header_read)
+
+    def _map_records(self, infile, path):
+        size = infile.seek(0, 2)
+        n_records = min(self.n_records, max(size - self.header_length, 0) // self.record_length)
+        if not n_records:
+            return numpy.empty(0, dtype=self.dtype)
+
+        return numpy.memmap(path, dtype=self.dtype, mode='r', offset=self.header_length, shape=(n_records,))
+
+    def _read_records(self, infile, n_records):
+        data = infile.read(n_records * self.record_length)
+        return numpy.frombuffer(data, dtype=self.dtype, count=len(data) // self.record_length)
+
+    def _set_records(self, records):
+        self.records = records
+
+        deleted = records['_deleted'] == b'*'
+        self.active = numpy.flatnonzero(~deleted) if deleted.any() else None
+
+    def _chunk(self, records):
+        chunk = copy.copy(self)
+        chunk._set_records(records)
+        return chunk
+
+    def __len__(self):
+        return len(self.records) if self.active is None else len(self.active)
+
+    def __contains__(self, field_name):
+        return field_name in self._fields
+
+    def __getitem__(self, field_name):
+        return self.decode(field_name)
+
+    def get_field(self, field_name):
+        return self._fields[field_name]
+
+    def raw(self, field_name):
+        """Returns the undecoded values of the field, as a view of the records when there are no deleted records"""
+        values = self.records[self.get_field(field_name).name]
+        return values if self.active is None else values[self.active]
+
+    def raw_range(self, field_name, start, length):
+        """
+        Returns the undecoded bytes of each record starting at position start of the field and spanning up to length
+        bytes, which may extend to the following fields, as an 'S' view of the records (no copy when there are no
+        deleted records)
+        """
+        offset = self.get_field(field_name).offset + start
+        length = min(length, self.record_length - offset)
+        if length <= 0:
+            return numpy.zeros(len(self), dtype='S1')
+
+        dtype = numpy.dtype({'names': ['value'], 'formats': [f'S{length}'], 'offsets': [offset],
+                             'itemsize': self.record_length})
+        values = self.records.view(dtype)['value']
+        return values if self.active is None else values[self.active]
+
+    def decode(self, field_name):
+        """Decodes the values of a field the same way dbfread does"""
+        field = self.get_field(field_name)
+        values = self.raw(field.name)
+
+        if field.type == 'C':
+            return self._decode_text(values)
+        elif field.type in 'NF':
+            return self._decode_number(field, values)
+        elif field.type == 'D':
+            import pandas
+            return pandas.to_datetime(self._decode_text(values), format='%Y%m%d', errors='coerce')
+        elif field.type == 'L':
+            return self._map_unique(values, lambda v: True if v in b'TtYy' else False if v in b'FfNn' else None)
+        else:
+            return values
+
+    def _map_unique(self, values, fn):
+        uniques, inverse = numpy.unique(values, return_inverse=True)
+
+        mapped = numpy.empty(len(uniques), dtype=object)
+        mapped[:] = [fn(v) for v in uniques]
+        return mapped[inverse.reshape(-1)]
+
+    def _decode_text(self, values):
+        encoding = self.encoding
+        return self._map_unique(values, lambda v: v.rstrip(b'\0 ').decode(encoding))
+
+    def _decode_number(self, field, values):
+        stripped = numpy.char.strip(numpy.char.strip(values), b'*')
+        empty = stripped == b''
+        if empty.any():
+            stripped = numpy.where(empty, b'nan', stripped)
+
+        try:
+            numbers = stripped.astype(numpy.float64)
+        except ValueError:
+            numbers = numpy.char.replace(stripped, b',', b'.').astype(numpy.float64)
+
+        if field.decimal_count == 0 and not empty.any() and numpy.array_equal(numbers, numpy.trunc(numbers)):
+            return numbers.astype(numpy.int64)
+
+        return numbers
+
+    def decode_range(self, field_name, start, length):
+        """
+        Decodes raw_range() as a pandas.Categorical of strings, decoding only the distinct values. Numbers are
+        zero-filled to the field length, as they are right-aligned with spaces, and trailing spaces are stripped.
+        """
+        import pandas
+
+        values = self.raw_range(field_name, start, length)
+        codes, uniques = _factorize_bytes(values)
+
+        # Parts of the value from numeric fields
+        offset = self.get_field(field_name).offset + start
+        end = offset + values.dtype.itemsize
+        numeric = [(max(f.offset, offset) - offset, min(f.offset + f.length, end) - offset) for f in self.fields
+                   if f.type in 'NF' and f.offset < end and f.offset + f.length > offset]
+
+        def decode(value):
+            if numeric:
+                value = bytearray(value.ljust(end - offset))
+                for s, e in numeric:
+                    value[s:e] = value[s:e].replace(b' ', b'0')
+            return value.rstrip(b'\0 ').decode(self.encoding)
+
+        decoded = {}
+        unique_codes = numpy.array([decoded.setdefault(decode(v), len(decoded)) for v in uniques.tolist()],
+                                   dtype=numpy.int64)
+        return pandas.Categorical.from_codes(unique_codes[codes], categories=list(decoded.keys()))
+
+    def to_dataframe(self, fields=None):
+        """Decodes fields (all by default) into a pandas DataFrame"""
+        import pandas
+
+        fields = [self.get_field(f).name for f in fields] if fields is not None else self.field_names
+        return pandas.DataFrame({f: self.decode(f) for f in fields})
@@ -1,52 +1,218 @@
+import io
+import logging
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import nocasedict
 
 import tabsus
+from tabsus import instrumentation
+from tabsus.conversion.cache import ConversionCache
 from tabsus.conversion.cnv import CnvParser
 from tabsus.conversion.dbf import DbfParser
+from tabsus.conversion.lru import LruCache
 from tabsus.file_loader import FileLoader, unix_path
 
 
 class ConversionLoader:
     """
     Reads and parses conversion files (CNV/DBF).
+
+    The parsed files are kept in cnv_files, an LruCache which may be limited by a number of entries and/or bytes so
+    that the least recently used files are evicted (and parsed again, or read from the persistent cache, when used
+    again). Files used on every query can be pinned to keep them in memory.
+
+    The loader is thread-safe: when many threads get a file that is not loaded yet, only one of them parses it while
+    the others wait for its result.
     """
     FILE_TYPES = {
         '.cnv': CnvParser,
-        '.dbf': DbfParser
+        '.dbf': DbfParser,
+        '.dbc': DbfParser
     }
 
-    def __init__(self, file_loader, encoding):
-        if not isinstance(file_loader, FileLoader):
+    def __init__(self, file_loader, encoding, cache=None, max_entries=None, max_bytes=None):
+        """
+        :param file_loader: FileLoader (or path of a directory/zip file) used to read the conversion files
+        :param encoding: default encoding of the conversion files
+        :param cache: persistent ConversionCache of the parsed files, a directory path for a ConversionCache in it,
+        True for a ConversionCache in the default directory or None to always parse the files
+        :param max_entries: maximum number of parsed files kept in memory, None for no limit
+        :param max_bytes: maximum estimated size of the parsed files kept in memory, None for no limit
+        """
+        if file_loader is not None and not isinstance(file_loader, FileLoader):
             file_loader = FileLoader.open(file_loader)
 
+        if cache is True:
+            cache = ConversionCache()
+        elif cache is not None and not isinstance(cache, ConversionCache):
+            cache = ConversionCache(os.fspath(cache))
+
         self.file_loader = file_loader
         self.encoding = encoding
-        self.cnv_files = nocasedict.NocaseDict()
+        self.cache = cache
+        self.cnv_files = LruCache(max_entries, max_bytes)
+        self._lock = threading.Lock()
+        self._loading = nocasedict.NocaseDict()
+        self._fields = nocasedict.NocaseDict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        del state['_loading']
+        return state
 
-    def get(self, path):
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._loading = nocasedict.NocaseDict()
+
+    def get(self, path, fields=None):
+        """
+        Returns the parsed conversion file of path, loading it if needed
+        :param fields: fields of a DBF file to be read (e.g. key and description fields), None for all fields.
+        A DBF file loaded without them is loaded again with the fields requested so far.
+        """
         path = unix_path(path)
 
-        cnv = self.cnv_files.get(path)
-        if not cnv:
-            cnv = self.load(path)
+        while True:
+            with self._lock:
+                cnv = self.cnv_files.get(path)
+                if cnv is not None and self._has_fields(cnv, fields):
+                    instrumentation.count('cnv_hit', path=path)
+                    return cnv
+
+                if fields is not None:
+                    fields = self._fields.get(path, set()) | {f.casefold() for f in fields}
+                    self._fields[path] = fields
+
+                future = self._loading.get(path)
+                loading = future is None
+                if loading:
+                    future = Future()
+                    self._loading[path] = future
+
+            if loading:
+                break
+
+            # the file loaded by another thread may not have the fields
+            with instrumentation.span('cnv_wait', path=path):
+                cnv = future.result()
+            if self._has_fields(cnv, fields):
+                return cnv
+
+        instrumentation.count('cnv_miss', path=path)
+        try:
+            cnv = self.load(path, fields=fields) if fields is not None else self.load(path)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[path]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
             self.cnv_files[path] = cnv
+            del self._loading[path]
+        future.set_result(cnv)
 
         return cnv
 
-    def load(self, path, encoding=tabsus.DEFAULT_ENCODING):
+    def _has_fields(self, cnv_file, fields):
+        # without a file loader the file can't be loaded again
+        has_fields = getattr(cnv_file, 'has_fields', None)
+        return has_fields is None or self.file_loader is None or has_fields(fields)
+
+    def pin(self, path):
+        """Keeps the conversion file in memory once loaded, regardless of the limits of cnv_files"""
+        self.cnv_files.pin(unix_path(path))
+
+    def unpin(self, path):
+        self.cnv_files.unpin(unix_path(path))
+
+    def stats(self):
+        """Returns the hits, misses and evictions of the parsed files, and the entries and bytes kept in memory"""
+        return self.cnv_files.stats()
+
+    def prefetch(self, def_access, max_workers=None):
+        """
+        Loads all the conversion files used by the variables of a DEF file in a pool of threads, so that the first
+        queries don't wait for them. Files that can't be loaded are logged and skipped.
+        :param def_access: a DefFileAccess (or DefFile)
+        :param max_workers: number of threads, see ThreadPoolExecutor
+        :return: the paths of the loaded files
+        """
+        def_file = getattr(def_access, 'def_file', def_access)
+
+        # the fields of the DBF files used by all the variables, None if a variable uses all of them
+        paths = nocasedict.NocaseDict()
+        for variable in def_file.variables:
+            if getattr(variable, 'cnv_filename', None):
+                path = unix_path(variable.cnv_filename)
+                fields = variable.conversion_fields
+                paths[path] = None if fields is None or paths.get(path, []) is None else paths.get(path, []) + fields
+
+        def load(path):
+            try:
+                self.get(path, paths[path])
+                return path
+            except Exception as e:
+                logging.warning(f"Unable to load {path} of {def_file.name}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers) as pool:
+            return [path for path in pool.map(load, list(paths.keys())) if path]
+
+    def subset(self, paths):
+        """
+        Returns a loader with only the given conversion files, already parsed, and no file loader.
+        It can be pickled, e.g. to share the parsed files with worker processes.
+        """
+        loader = ConversionLoader(None, self.encoding)
+        for path in paths:
+            loader.cnv_files[unix_path(path)] = self.get(path)
+
+        return loader
+
+    def load(self, path, encoding=tabsus.DEFAULT_ENCODING, fields=None):
         file_ext = os.path.splitext(path)[1].lower()
 
         parser_class = ConversionLoader.FILE_TYPES.get(file_ext)
-        if parser_class:
+        if not self.file_loader:
+            raise FileNotFoundError(f"File '{path}' is not loaded and there is no file loader")
+        elif parser_class:
             path = unix_path(path)
-            with self.file_loader.load(path).open() as file:
-                file_name = os.path.basename(path)
-                encoding = encoding or self.encoding or tabsus.DEFAULT_ENCODING
+            resource = self.file_loader.load(path)
+            if not resource:
+                raise FileNotFoundError(f"File '{path}' not found")
+
+            encoding = encoding or self.encoding or tabsus.DEFAULT_ENCODING
+            cnv_file = None
+            if self.cache:
+                with instrumentation.span('cnv_cache_read', path=path) as span:
+                    cnv_file = self.cache.get(resource, encoding)
+                    if cnv_file is not None and not self._has_fields(cnv_file, fields):
+                        cnv_file = None
+                    span.set(hit=cnv_file is not None)
+
+            if cnv_file is None:
+                with resource.open() as file:
+                    if instrumentation.is_enabled():
+                        # The file is read at once, so the time spent reading it (e.g. from a zip) is told from
+                        # parsing. Otherwise it is parsed as it is read.
+                        with instrumentation.span('file_read', path=path) as span:
+                            contents = file.read()
+                            span.set(bytes=len(contents))
+                        file = io.BytesIO(contents)
+
+                    with instrumentation.span('cnv_parse', path=path):
+                        options = {'fields': fields} if fields is not None and parser_class is DbfParser else {}
+                        cnv_file = parser_class(file, os.path.basename(path), encoding, **options).parse()
+
+                if self.cache:
+                    self.cache.put(resource, encoding, cnv_file)
 
-                parser = parser_class(file, file_name, encoding)
-                return parser.parse()
+            return cnv_file
         else:
             raise NotImplementedError(f"File '{path}' is not supported."
                                       f"Supported types: {ConversionLoader.FILE_TYPES.keys()}")
@@ -0,0 +1,180 @@
+import collections
+import collections.abc
+import sys
+import threading
+
+import numpy
+
+
+def estimate_size(obj):
+    """
+    Estimates the memory used by obj and all the objects it references (attributes, items of containers and buffers
+    of numpy arrays). Shared objects are counted once.
+    """
+    seen = set()
+    size = 0
+
+    pending = [obj]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, type):
+            continue
+        seen.add(id(obj))
+
+        if isinstance(obj, numpy.ndarray):
+            size += sys.getsizeof(obj) + (obj.nbytes if obj.base is None else 0)
+            if obj.dtype.hasobject:
+                pending.extend(obj.ravel().tolist())
+            continue
+
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+            continue
+        elif isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+            pending.extend(obj)
+
+        if hasattr(obj, '__dict__'):
+            pending.append(obj.__dict__)
+        for slot in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, slot):
+                pending.append(getattr(obj, slot))
+
+    return size
+
+
+class LruCache(collections.abc.MutableMapping):
+    """
+    Case-insensitive mapping of conversion file paths to parsed files, evicting the least recently used entries when
+    it exceeds a budget of entries and/or bytes (estimated with estimate_size() when the entry is added). Pinned
+    entries are never evicted, and the last added entry is always kept even if it exceeds the budget alone.
+
+    get() counts hits and misses, and the evicted entries are counted too, see stats().
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=estimate_size):
+        """
+        :param max_entries: maximum number of entries, None for no limit
+        :param max_bytes: maximum estimated size of the entries, None for no limit
+        :param sizeof: function estimating the size of an entry, used only with max_bytes
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = collections.OrderedDict()  # casefolded key -> (key, value, size)
+        self._pinned = set()
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(key):
+        return key.casefold()
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._entries[self._key(key)]
+            self._entries.move_to_end(self._key(key))
+            return entry[1]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(self._key(key))
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self._entries.move_to_end(self._key(key))
+            return entry[1]
+
+    def __setitem__(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+
+        with self._lock:
+            self._remove(self._key(key))
+            self._entries[self._key(key)] = (key, value, size)
+            self._size += size
+            self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            if not self._remove(self._key(key)):
+                raise KeyError(key)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._key(key) in self._entries
+
+    def __iter__(self):
+        return iter([key for key, _, _ in list(self._entries.values())])
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        """Estimated size of the entries in bytes (0 without max_bytes)"""
+        return self._size
+
+    def pin(self, key):
+        """Keeps the entry of key (which may not be loaded yet) from being evicted"""
+        with self._lock:
+            self._pinned.add(self._key(key))
+
+    def unpin(self, key):
+        with self._lock:
+            self._pinned.discard(self._key(key))
+            self._evict()
+
+    def is_pinned(self, key):
+        return self._key(key) in self._pinned
+
+    def stats(self):
+        """Returns a dictionary with the counters and the current usage of the cache"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'pinned': len(self._pinned)
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._size -= entry[2]
+        return entry is not None
+
+    def _over_budget(self):
+        return ((self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self._size > self.max_bytes))
+
+    def _evict(self):
+        if not self._over_budget():
+            return
+
+        # From the least recently used, keeping the pinned entries and the last one
+        for key in list(self._entries.keys())[:-1]:
+            if key not in self._pinned:
+                self._remove(key)
+                self.evictions += 1
+
+                if not self._over_budget():
+                    break
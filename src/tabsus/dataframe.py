@@ -1,7 +1,9 @@
+import numpy
 import pandas
 
-from tabsus.definition import DefFileContext
+from tabsus.definition import DefDimension, DefFileContext
 from tabsus.definition.access import DefVariableList, RecordAccess
+from tabsus.tabulation import Tabulation
 
 
 @pandas.api.extensions.register_dataframe_accessor("tabsus")
@@ -14,8 +16,8 @@ class TabSusAccessor:
 
 
 class DataFrameWrapper:
-    def __init__(self, def_access, df):
-        self.def_access = DataFrameAccess(def_access, df)
+    def __init__(self, def_access, df, vectorized=True):
+        self.def_access = DataFrameAccess(def_access, df, vectorized)
         self.df = df
 
     def __getattr__(self, name):
@@ -33,6 +35,12 @@ class DataFrameWrapper:
     def _get_variables(self, vars):
         return DefVariableListWrapper(self.df, [DataFrameVariableAccess(self, v) for v in vars])
 
+    def transform_many(self, variables=None):
+        return self.def_access.transform_many(self.df, variables)
+
+    def tabulate(self, rows=None, columns=None, increment=None, filters=None, subtotals=False):
+        return self.def_access.tabulate(self.df, rows, columns, increment, filters, subtotals=subtotals)
+
     @property
     def columns(self):
         return self._get_variables(self.def_access.columns)
@@ -66,26 +74,49 @@ class DataFrameVariableWrapper:
         self.df = df
 
 
+def _max_length(lengths):
+    """Maximum of the lengths of the values, ignoring missing values (0 if there are none)"""
+    return int(lengths[~numpy.isnan(lengths)].max(initial=0))
+
+
 class DataFrameRecordAccess(RecordAccess):
-    def __init__(self, schema):
+    """
+    Record access over whole dataframes, where extracted values are series instead of scalars.
+
+    When vectorized, mapping factorizes the series and applies the function only once per distinct value,
+    broadcasting the results back to the rows. Otherwise the function is applied to every row.
+
+    Categories are returned as pandas.Categorical series, with all the categories of the conversion file sorted by
+    their order (as in TabWin), holding only an integer code per row.
+    """
+
+    def __init__(self, schema, vectorized=True):
         self.schema = schema
+        self.vectorized = vectorized
         self.indexes = {schema[i]: i for i in range(len(schema))}
 
     def extract_range(self, dataframe, field_name, start, length):
         result = dataframe[field_name]
 
+        # The following fields are concatenated once, the lengths of the rows are summed to know when to stop
+        parts = []
         field_index = self.indexes[field_name] + 1
-        cur_len = result.str.len().max()
+        lengths = result.str.len().to_numpy(dtype=float, na_value=numpy.nan)
+        cur_len = _max_length(lengths)
         while cur_len < start + length and field_index < len(self.indexes):
             next_series = dataframe[self.schema[field_index]]
             # TODO: find a better way to handle these rare cases where the following field is not string
-            if next_series.dtype != object:
-                fmt = "{:0>" + f"{(length - (cur_len - start))}" + "}"
-                next_series = next_series.map(fmt.format)
+            if not pandas.api.types.is_string_dtype(next_series):
+                width = length - (cur_len - start)
+                next_series = next_series.astype(str).str.pad(width, side='left', fillchar='0')
 
-            result = result + next_series
+            parts.append(next_series)
             field_index += 1
-            cur_len = result.str.len().max()
+            lengths = lengths + next_series.str.len().to_numpy(dtype=float, na_value=numpy.nan)
+            cur_len = _max_length(lengths)
+
+        if parts:
+            result = result.str.cat(parts)
 
         return result.str[start:start + length]
 
@@ -93,7 +124,44 @@ class DataFrameRecordAccess(RecordAccess):
         return dataframe[field_name]
 
     def map(self, series, fn):
-        return series.apply(fn)
+        if not self.vectorized:
+            return series.apply(fn)
+
+        codes, uniques = pandas.factorize(series)
+        mapped = [fn(v) for v in uniques]
+        if (codes < 0).any():
+            # missing values are factorized as -1, which indexes the last element
+            mapped.append(fn(None))
+
+        result = numpy.empty(len(mapped), dtype=object)
+        result[:] = mapped
+        return pandas.Series(result[codes], index=series.index, name=series.name)
+
+    def categorize(self, series, dimension, cnv_file):
+        if self.vectorized:
+            codes, uniques = self.factorize(series)
+            categorical = self.categorize_factorized(codes, uniques, dimension, cnv_file)
+        else:
+            descriptions, _ = cnv_file.get_category_order(dimension)
+            categorical = pandas.Categorical(super().categorize(series, dimension, cnv_file), categories=descriptions)
+
+        return pandas.Series(categorical, index=series.index, name=series.name)
+
+    @staticmethod
+    def factorize(series):
+        """Returns the code of each value and the distinct values, missing values (code -1) being the last one"""
+        codes, uniques = pandas.factorize(series)
+        return codes, numpy.append(numpy.asarray(uniques, dtype=object), None)
+
+    @staticmethod
+    def categorize_factorized(codes, uniques, dimension, cnv_file):
+        """Converts factorized values to a pandas.Categorical, looking up only the distinct values"""
+        descriptions, category_codes = cnv_file.get_category_order(dimension)
+
+        # position -1 (no category) indexes the appended -1 code
+        positions = cnv_file.lookup_many(dimension, uniques)
+        unique_codes = numpy.append(category_codes, -1)[positions]
+        return pandas.Categorical.from_codes(unique_codes[codes], categories=descriptions)
 
 
 class DataFrameVariableAccess:
@@ -123,12 +191,12 @@ class DataFrameVariableAccess:
 
 
 class DataFrameAccess(DefFileContext):
-    def __init__(self, def_access, schema):
+    def __init__(self, def_access, schema, vectorized=True):
         self.def_access = def_access
         if isinstance(schema, pandas.DataFrame):
             schema = schema.columns
 
-        super().__init__(def_access.def_file, def_access.cnv_loader, DataFrameRecordAccess(schema))
+        super().__init__(def_access.def_file, def_access.cnv_loader, DataFrameRecordAccess(schema, vectorized))
 
     def _get_variables(self, vars):
         return DefVariableList([DataFrameVariableAccess(self, v) for v in vars])
@@ -158,5 +226,54 @@ class DataFrameAccess(DefFileContext):
     def transform(self, variable, df):
         return variable.def_var.extract(self, record)
 
+    def transform_many(self, df, variables=None):
+        """
+        Transforms many variables of df at once. Each distinct field slice (field, start and length) is extracted and
+        factorized only once, even if it is read by many variables (e.g. UF, region and municipality of MUNIC_MOV),
+        and only its distinct values are converted by the conversion file of each variable. When not vectorized, each
+        variable is transformed row by row instead.
+        :param df: a dataframe with the records
+        :param variables: variables (names or variables), by default all the variables of the DEF file
+        :return: a dataframe with a column for each variable
+        """
+        if variables is None:
+            variables = list(dict.fromkeys(v.name for v in self.def_access.variables))
+
+        factorized = {}
+        result = {}
+        for variable in variables:
+            def_var = getattr(self.def_access[variable] if isinstance(variable, str) else variable, 'def_var', variable)
+            if not isinstance(def_var, DefDimension):
+                result[def_var.name] = self.get_value(def_var, df)
+                continue
+
+            if not self.record_access.vectorized:
+                result[def_var.name] = self.get_category(def_var, df)
+                continue
+
+            cnv_file = self.get_cnv(def_var)
+            key = (def_var.field.casefold(), def_var.start, getattr(cnv_file, 'length', None))
+            if key not in factorized:
+                factorized[key] = self.record_access.factorize(self.get_code(def_var, df))
+
+            codes, uniques = factorized[key]
+            categorical = self.record_access.categorize_factorized(codes, uniques, def_var, cnv_file)
+            result[def_var.name] = pandas.Series(categorical, index=df.index)
+
+        return pandas.DataFrame(result, index=df.index)
+
+    def tabulate(self, df, rows=None, columns=None, increment=None, filters=None, subtotals=False):
+        """
+        Tabulates df summing the increment (or counting records) by the categories of rows and columns
+        :param df: a dataframe with the records
+        :param rows: row variable (name or variable) or list of row variables
+        :param columns: column variable or list of column variables
+        :param increment: increment variable, if None the records are counted
+        :param filters: dictionary mapping selection variables to the accepted categories
+        :param subtotals: if True, also tabulates the subtotal lines of the CNV files (e.g. regions above UFs)
+        :return: a dataframe indexed by the row categories with a column for each column category
+        """
+        return Tabulation(self, rows, columns, increment, filters, subtotals)(df)
+
     def get_cnv(self, cnv_filename):
         return self.def_access.get_cnv(cnv_filename)
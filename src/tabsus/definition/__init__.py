@@ -1,3 +1,6 @@
+from tabsus import instrumentation
+
+
 class DefVariable:
     """
     Represents a column, row or selection described in a DEF file.
@@ -57,6 +60,11 @@ class DefDimension(DefVariable):
     def __str__(self):
         return f"{self.var_type}{self.name}, {self.field}, {self.start}, {self.cnv_filename}"
 
+    @property
+    def conversion_fields(self):
+        """Fields read from the DBF conversion file (the key and description fields), None for CNV files"""
+        return [self.field, self.dbf_field] if self.dbf_field else None
+
     def transform(self, def_access, record):
         """Extracts the value from the record and convert to the corresponding category."""
         return def_access.get_category(self, record)
@@ -118,17 +126,47 @@ class DefFileContext:
         :param dimension: a DefDimension
         :return: a ConversionFile obtained by parsing cnv_filename
         """
-        return self.cnv_loader.get(dimension.cnv_filename)
+        return self.cnv_loader.get(dimension.cnv_filename, getattr(dimension, 'conversion_fields', None))
+
+    def get_fields(self, variables, schema):
+        """
+        Returns the fields read by variables, including the following fields a value may extend to.
+        :param variables: list of DefVariables
+        :param schema: list of (field name, field length) in record order
+        :return: list of field names in record order
+        """
+        names = [name for name, _ in schema]
+        lengths = [length for _, length in schema]
+        indexes = {name.casefold(): i for i, name in enumerate(names)}
+
+        selected = set()
+        for variable in variables:
+            index = indexes.get(variable.field.casefold())
+            if index is None:
+                continue
+
+            selected.add(index)
+            if isinstance(variable, DefDimension) and variable.start is not None:
+                end = variable.start + (getattr(self.get_cnv(variable), 'length', None) or 0)
+                covered = lengths[index]
+                while covered < end and index + 1 < len(names):
+                    index += 1
+                    covered += lengths[index]
+                    selected.add(index)
+
+        return [names[i] for i in sorted(selected)]
 
     def get_value(self, variable, record):
         return self.record_access.extract_field(record, variable.field)
 
-    def get_category(self, dimension, record):
+    def get_code(self, dimension, record):
+        """Extracts the raw value used to find the category of dimension in record"""
         cnv_file = self.get_cnv(dimension)
-        value = cnv_file.extract_value(dimension, self.record_access, record)
+        return cnv_file.extract_value(dimension, self.record_access, record)
 
-        def map_to_category(v):
-            category = cnv_file.find_category(dimension, v)
-            return category.description if category else None
-
-        return self.record_access.map(value, map_to_category)
+    def get_category(self, dimension, record):
+        with instrumentation.span('transform', variable=dimension.name) as span:
+            cnv_file = self.get_cnv(dimension)
+            value = self.get_code(dimension, record)
+            span.set(rows=len(value) if hasattr(value, '__len__') and not isinstance(value, str) else 1)
+            return self.record_access.categorize(value, dimension, cnv_file)
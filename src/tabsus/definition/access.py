@@ -1,4 +1,9 @@
+import os
+
+import tabsus
 from tabsus.conversion import RecordAccess
+from tabsus.conversion.dbf import DbfRecordAccess, DbfTable
+from tabsus.file_loader import Resource, find_files
 from tabsus.definition import DefDimension, DefFileContext
 
 
@@ -8,6 +13,10 @@ class DefVariableAccess:
         self.def_var = def_var
 
     def __getattr__(self, attr):
+        # def_var is looked up here before it is set (e.g. when unpickled)
+        if attr == 'def_var':
+            raise AttributeError(attr)
+
         return getattr(self.def_var, attr)
 
     def __str__(self):
@@ -72,14 +81,17 @@ class DictionaryRecordAccess(RecordAccess):
         self.indexes = {self.schema[i]: i for i in range(len(self.schema))}
 
     def extract_range(self, record, field_name, start, length):
-        result = ''
+        parts = []
+        cur_len = 0
 
         field_index = self.indexes[field_name]
-        while len(result) < start + length and field_index < len(self.indexes):
-            result += record[self.schema[field_index]]
+        while cur_len < start + length and field_index < len(self.indexes):
+            value = record[self.schema[field_index]]
+            parts.append(value)
+            cur_len += len(value)
             field_index += 1
 
-        return result[start:start + length]
+        return ''.join(parts)[start:start + length]
 
     def extract_field(self, record, field_name):
         return record[field_name]
@@ -91,6 +103,7 @@ class DictionaryRecordAccess(RecordAccess):
 class DefFileAccess(DefFileContext):
     def __init__(self, def_file, cnv_loader, schema=None):
         super().__init__(def_file, cnv_loader, DefFileAccess._get_record_access(schema))
+        tabsus.register_accessor()
         # self.def_file = def_file
         # self.cnv_loader = cnv_loader
         self.variables = [DefVariableAccess(self, v) for v in def_file.variables]
@@ -100,7 +113,9 @@ class DefFileAccess(DefFileContext):
 
     @staticmethod
     def _get_record_access(schema):
-        if isinstance(schema, dict):
+        if isinstance(schema, RecordAccess):
+            return schema
+        elif isinstance(schema, dict):
             schema = list(schema.keys())
 
         if isinstance(schema, list):
@@ -194,3 +209,129 @@ class DefFileAccess(DefFileContext):
 
         cnv = self.get_cnv(variable)
         return [c.description for c in cnv.get_categories(variable)]
+
+    def read_dbf(self, file, variables=None, encoding=None):
+        """
+        Reads a DBF file into a dataframe decoding only the fields read by variables
+        :param file: DBF file path, Resource or DbfTable
+        :param variables: variables (or variable names), all the DEF variables by default
+        :return: a dataframe with the needed fields
+        """
+        if not isinstance(file, DbfTable):
+            file = DbfTable(file, encoding or self.cnv_loader.encoding or tabsus.DEFAULT_ENCODING)
+
+        if variables is None:
+            variables = self.def_file.variables
+        else:
+            variables = [v for var in variables for v in self._get_def_vars(var)]
+
+        schema = [(f.name, f.length) for f in file.fields]
+        return file.to_dataframe(self.get_fields(variables, schema))
+
+    def _get_def_vars(self, variable):
+        if isinstance(variable, str):
+            return [v for v in self.def_file.variables if v.name == variable]
+
+        return [getattr(variable, 'def_var', variable)]
+
+    def find_files(self, data_dir, filters=None, partitioning=None):
+        """
+        Returns the paths of the data files in data_dir matching the DEF file pattern (e.g. DADOS\\RD*.DBC).
+        When there are filters, the files whose names show they can't contain matching records are skipped.
+        :param filters: dictionary mapping selection variables to the accepted categories
+        :param partitioning: FilePartitioning deriving field values from file names, DATASUS naming by default
+        """
+        if not self.def_file.file_pattern:
+            raise ValueError(f"No file pattern defined in {self.name}")
+
+        files = find_files(data_dir, self.def_file.file_pattern)
+        if filters:
+            from tabsus.partition import DATASUS_PARTITIONING
+            files = (partitioning or DATASUS_PARTITIONING).prune(files, self, filters)
+
+        return files
+
+    def tabulate_files(self, data_dir, rows=None, columns=None, increment=None, filters=None,
+                       processes=None, chunk_size=None, partitioning=None, subtotals=False):
+        """
+        Tabulates the data files in data_dir matching the DEF file pattern, using a pool of processes
+        (by default one for each CPU). Files that can't match the filters are skipped. See tabulate(), find_files()
+        """
+        files = self.find_files(data_dir, filters, partitioning)
+        if not files:
+            raise FileNotFoundError(f"No files matching {self.def_file.file_pattern} and the filters in {data_dir}")
+
+        return self.tabulate(files, rows, columns, increment, filters, chunk_size, processes, subtotals)
+
+    def tabulate(self, records, rows=None, columns=None, increment=None, filters=None, chunk_size=None,
+                 processes=1, subtotals=False):
+        """
+        Tabulates records, which can be a dataframe, an iterable of dictionaries or one or more DBF/DBC files.
+        DBF files are read in chunks of chunk_size records, decoding only the fields needed by the tabulation.
+        Multiple files are tabulated in parallel when processes is not 1 (None uses all CPUs).
+        See DataFrameAccess.tabulate()
+        """
+        import pandas
+        from tabsus.dataframe import DataFrameAccess
+
+        if _is_file(records) or (isinstance(records, (list, tuple)) and records and all(map(_is_file, records))):
+            files = records if isinstance(records, (list, tuple)) else [records]
+            if processes != 1 and len(files) > 1:
+                from tabsus.parallel import tabulate_files
+                return tabulate_files(self, files, rows, columns, increment, filters, processes, chunk_size,
+                                      subtotals)
+
+            tabulation, partial = self.aggregate_files(files, rows, columns, increment, filters, chunk_size,
+                                                       subtotals)
+            return tabulation.finalize(partial)
+
+        if not isinstance(records, pandas.DataFrame):
+            records = pandas.DataFrame.from_records(list(records))
+
+        return DataFrameAccess(self, records).tabulate(records, rows, columns, increment, filters, subtotals)
+
+    def tabulate_chunks(self, chunks, rows=None, columns=None, increment=None, filters=None, subtotals=False):
+        """
+        Tabulates an iterable of dataframes. The partial aggregate of each dataframe is merged as soon as it is
+        computed, so only one dataframe needs to be in memory at a time.
+        """
+        tabulation, partial = self.aggregate_chunks(chunks, rows, columns, increment, filters, subtotals)
+        return tabulation.finalize(partial)
+
+    def aggregate_files(self, files, rows=None, columns=None, increment=None, filters=None, chunk_size=None,
+                        subtotals=False):
+        """Aggregates DBF/DBC files in chunks. See aggregate_chunks()"""
+        encoding = self.cnv_loader.encoding or tabsus.DEFAULT_ENCODING
+
+        # the chunks are tabulated straight from the raw records, decoding only the distinct values
+        chunks = (chunk for file in files for chunk in DbfTable.iter_chunks(file, chunk_size, encoding))
+        return self.aggregate_chunks(chunks, rows, columns, increment, filters, subtotals)
+
+    def aggregate_chunks(self, chunks, rows=None, columns=None, increment=None, filters=None, subtotals=False):
+        """
+        Returns the Tabulation and the merged partial aggregate (by raw codes) of an iterable of dataframes
+        (or DbfTables)
+        """
+        from tabsus.dataframe import DataFrameAccess
+        from tabsus.tabulation import Tabulation
+
+        tabulation = None
+        partial = None
+        for df in chunks:
+            if isinstance(df, DbfTable):
+                context = DefFileAccess(self.def_file, self.cnv_loader, DbfRecordAccess())
+            else:
+                context = DataFrameAccess(self, df)
+
+            tabulation = Tabulation(context, rows, columns, increment, filters, subtotals)
+            aggregated = tabulation.aggregate(df)
+            partial = aggregated if partial is None else tabulation.merge([partial, aggregated])
+
+        if tabulation is None:
+            raise ValueError("No records to tabulate")
+
+        return tabulation, partial
+
+
+def _is_file(obj):
+    return isinstance(obj, (str, os.PathLike, Resource, DbfTable)) or hasattr(obj, 'read')
@@ -1,9 +1,10 @@
 import re
 import fnmatch
 import zipfile
-from pathlib import Path
 import os.path
 
+from tabsus import instrumentation
+
 
 class Resource:
     """Refers to a file/object reference that can be opened for reading"""
@@ -12,6 +13,17 @@ class Resource:
         """Open the resource, returning a closable object that can be used for reading as a binary file"""
         pass
 
+    def identity(self):
+        """Returns a string identifying the resource (e.g. its absolute path), or None if it can't be identified"""
+        return None
+
+    def fingerprint(self):
+        """
+        Returns a string identifying the resource and its current contents (e.g. path, size and modification time),
+        or None if it can't be identified. Used to key persistent caches of parsed files.
+        """
+        return None
+
 
 class FileLoader:
     def load(self, path):
@@ -52,17 +64,75 @@ def case_insensitive_resolve_path(base, path):
     return cur_path
 
 
+def find_files(base, pattern):
+    """
+    Returns the paths of the files matching a TabWin file pattern (e.g. DADOS\\RD*.DBC), ignoring case.
+    The pattern directory is resolved relative to base, if it doesn't exist the files are searched in base.
+    """
+    directory, name = os.path.split(unix_path(pattern).strip('/'))
+
+    path = case_insensitive_resolve_path(base, directory) if directory else base
+    if not path or not os.path.isdir(path):
+        path = base
+
+    regex = re.compile(fnmatch.translate(name), re.IGNORECASE)
+    return sorted(os.path.join(path, f) for f in os.listdir(path)
+                  if regex.match(f) and os.path.isfile(os.path.join(path, f)))
+
+
 class FileSystemLoader(FileLoader):
+    """
+    Loads files from a directory, ignoring case. The paths of all the files are indexed (case-folded) the first time
+    a file is loaded, and the index is rebuilt when a file is not found and a directory has changed since then.
+    """
+
     def __init__(self, path):
         self.root = path
+        self._index = None
+        self._dir_mtimes = None
+
+    def _get_index(self, refresh=False):
+        if self._index is None or (refresh and self._has_changed()):
+            index = {}
+            dir_mtimes = {}
+            for directory, dirs, files in os.walk(self.root):
+                dirs.sort()
+                dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+
+                relative = os.path.relpath(directory, self.root)
+                prefix = '' if relative == os.curdir else unix_path(relative) + '/'
+                for file in sorted(files):
+                    index.setdefault((prefix + file).casefold(), os.path.join(directory, file))
+
+            self._index = index
+            self._dir_mtimes = dir_mtimes
+
+        return self._index
+
+    def _has_changed(self):
+        for directory, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+
+        return False
 
     def load(self, path):
-        file_path = case_insensitive_resolve_path(self.root, path)
-        return FileResource(file_path) if file_path else None
+        with instrumentation.span('file_load', path=path):
+            key = _index_key(path)
+            file_path = self._get_index().get(key) or self._get_index(refresh=True).get(key)
+            return FileResource(file_path) if file_path else None
 
     def list_files(self, glob):
         regex = re.compile(fnmatch.translate(glob), re.IGNORECASE)
-        return [f.name for f in Path(self.root).rglob('*') if regex.match(f.name)]
+        names = (os.path.basename(f) for f in self._get_index().values())
+        return [name for name in names if regex.match(name)]
+
+
+def _index_key(path):
+    return '/'.join(part for part in unix_path(path).split('/') if part).casefold()
 
 
 class FileResource(Resource, os.PathLike):
@@ -72,6 +142,13 @@ class FileResource(Resource, os.PathLike):
     def open(self):
         return open(self.file_path, mode="rb")
 
+    def identity(self):
+        return os.path.abspath(self.file_path)
+
+    def fingerprint(self):
+        stat = os.stat(self.file_path)
+        return f"{self.identity()}:{stat.st_size}:{stat.st_mtime_ns}"
+
     def __fspath__(self):
         return self.file_path
 
@@ -80,19 +157,21 @@ class FileResource(Resource, os.PathLike):
 
 
 class ZipFileLoader(FileLoader):
+    """Loads files from a zip file, ignoring case. The entries are indexed by their case-folded path when opened."""
+
     def __init__(self, zip_file):
         if not isinstance(zip_file, zipfile.ZipFile):
             zip_file = zipfile.ZipFile(zip_file)
 
         self.zip_file = zip_file
+        self.index = {}
+        for info in zip_file.infolist():
+            self.index.setdefault(_index_key(info.filename), info)
 
     def load(self, path):
-        case_insensitive_path = path.casefold()
-        for f in self.zip_file.infolist():
-            if f.filename.casefold() == case_insensitive_path:
-                return ZipResource(self.zip_file, f)
-
-        return None
+        with instrumentation.span('file_load', path=path):
+            info = self.index.get(_index_key(path))
+            return ZipResource(self.zip_file, info) if info else None
 
     def list_files(self, glob):
         regex = re.compile(fnmatch.translate(glob), re.IGNORECASE)
@@ -107,6 +186,19 @@ class ZipResource(Resource, os.PathLike):
     def open(self):
         return self.zip_file.open(self.zip_info, mode='r')
 
+    def identity(self):
+        if not isinstance(self.zip_file.filename, str):
+            return None
+
+        return f"{os.path.abspath(self.zip_file.filename)}!{self.zip_info.filename}"
+
+    def fingerprint(self):
+        identity = self.identity()
+        if not identity:
+            return None
+
+        return f"{identity}:{self.zip_info.file_size}:{self.zip_info.CRC:08x}"
+
     def __fspath__(self):
         return self.zip_info.filename
 
@@ -0,0 +1,175 @@
+"""
+Opt-in instrumentation of the hot paths: loading and parsing of files, conversion file cache hits and misses,
+transformation of variables and aggregation of records.
+
+It is disabled by default, when an instrumented operation costs a single check. Events are collected by a Stats
+object while enabled, and are passed to hooks, functions called with the name of the event, its duration in seconds
+and a dictionary with its details (e.g. path, variable, rows):
+
+    with instrumentation.instrument() as stats:
+        rd2008.tabulate(files, rows='UF internação')
+    print(stats.report())
+
+    instrumentation.add_hook(instrumentation.log_hook())
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Stats:
+    """Number of occurrences, total and maximum duration and rows processed of each event"""
+
+    def __init__(self):
+        self.events = {}
+        self._lock = threading.Lock()
+
+    def record(self, event, seconds=0.0, rows=0):
+        with self._lock:
+            entry = self.events.get(event)
+            if entry is None:
+                entry = self.events[event] = {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0}
+
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['rows'] += rows
+
+    def __getitem__(self, event):
+        with self._lock:
+            return dict(self.events.get(event) or {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0})
+
+    def summary(self):
+        """Returns a copy of the entries of all events"""
+        with self._lock:
+            return {event: dict(entry) for event, entry in self.events.items()}
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+
+    def report(self):
+        """Returns a table of the events, by total duration"""
+        lines = [f"{'event':<16} {'count':>10} {'seconds':>10} {'max':>10} {'rows':>12}"]
+        for event, entry in sorted(self.summary().items(), key=lambda it: -it[1]['seconds']):
+            lines.append(f"{event:<16} {entry['count']:>10} {entry['seconds']:>10.3f} {entry['max_seconds']:>10.3f} "
+                         f"{entry['rows']:>12}")
+
+        return '\n'.join(lines)
+
+
+_stats = None
+_hooks = []
+
+
+def enable(stats=None):
+    """Starts collecting the events in stats (a new Stats by default), returning it"""
+    global _stats
+    _stats = stats if stats is not None else Stats()
+    return _stats
+
+
+def disable():
+    global _stats
+    _stats = None
+
+
+def get_stats():
+    """Returns the Stats collecting the events, None if disabled"""
+    return _stats
+
+
+@contextmanager
+def instrument(stats=None):
+    """Collects the events in stats (a new Stats by default) within the context"""
+    previous = _stats
+    try:
+        yield enable(stats)
+    finally:
+        enable(previous) if previous is not None else disable()
+
+
+def add_hook(hook):
+    """Calls hook(event, seconds, info) on every event, even if the Stats are disabled"""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def log_hook(logger=None, level=logging.DEBUG):
+    """Returns a hook logging the events"""
+    logger = logger or logging.getLogger('tabsus.instrumentation')
+
+    def hook(event, seconds, info):
+        if logger.isEnabledFor(level):
+            details = ', '.join(f"{k}={v}" for k, v in info.items())
+            logger.log(level, f"{event} {seconds * 1000:.3f} ms" + (f" ({details})" if details else ""))
+
+    return hook
+
+
+def _emit(event, seconds, info):
+    stats = _stats
+    if stats is not None:
+        stats.record(event, seconds, info.get('rows', 0))
+
+    for hook in list(_hooks):
+        hook(event, seconds, info)
+
+
+class _Span:
+    __slots__ = ('event', 'info', 'start')
+
+    def __init__(self, event, info):
+        self.event = event
+        self.info = info
+        self.start = None
+
+    def set(self, **info):
+        """Adds details known only at the end of the span (e.g. the number of rows)"""
+        self.info.update(info)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _emit(self.event, time.perf_counter() - self.start, self.info)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **info):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def is_enabled():
+    return _stats is not None or bool(_hooks)
+
+
+def span(event, **info):
+    """Context manager timing an event (doing nothing if the instrumentation is disabled)"""
+    if _stats is None and not _hooks:
+        return _NULL_SPAN
+
+    return _Span(event, info)
+
+
+def count(event, **info):
+    """Records an event without duration (e.g. a cache hit)"""
+    if _stats is not None or _hooks:
+        _emit(event, 0.0, info)
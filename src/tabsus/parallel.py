@@ -0,0 +1,52 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas
+
+from tabsus.definition import DefDimension
+from tabsus.tabulation import Tabulation
+
+_worker = {}
+
+
+def _init_worker(def_file, cnv_loader, arguments):
+    from tabsus.definition.access import DefFileAccess
+
+    _worker['def_access'] = DefFileAccess(def_file, cnv_loader)
+    _worker['arguments'] = arguments
+
+
+def _aggregate_file(file):
+    rows, columns, increment, filters, chunk_size = _worker['arguments']
+    tabulation, partial = _worker['def_access'].aggregate_files([file], rows, columns, increment, filters, chunk_size)
+    return partial
+
+
+def tabulate_files(def_access, files, rows=None, columns=None, increment=None, filters=None,
+                   processes=None, chunk_size=None, subtotals=False, mp_context=None):
+    """
+    Tabulates DBF/DBC files in a pool of processes, one file per task, merging the partial aggregates of the files.
+    The conversion files are parsed once and sent to the workers when they start, along with the DEF file, so the
+    workers can be spawned (the DefFileAccess is built by each worker).
+    :param def_access: a DefFileAccess
+    :param files: paths of the files
+    :param processes: number of worker processes, by default the number of CPUs
+    :param mp_context: multiprocessing context of the workers, by default the one of the platform
+    """
+    from tabsus.dataframe import DataFrameAccess
+
+    if not files:
+        raise ValueError("No files to tabulate")
+
+    tabulation = Tabulation(def_access, rows, columns, increment, filters, subtotals)
+    cnv_filenames = {v.cnv_filename for v in tabulation.variables if isinstance(v, DefDimension)}
+
+    cnv_loader = def_access.cnv_loader.subset(cnv_filenames)
+    arguments = (tabulation.rows, tabulation.columns, tabulation.increment,
+                 {selection: accepted for selection, accepted in tabulation.filters}, chunk_size)
+
+    with ProcessPoolExecutor(processes, mp_context, initializer=_init_worker,
+                             initargs=(def_access.def_file, cnv_loader, arguments)) as pool:
+        partials = list(pool.map(_aggregate_file, files))
+
+    tabulation = Tabulation(DataFrameAccess(def_access, pandas.DataFrame()), *arguments[:-1], subtotals)
+    return tabulation.finalize(tabulation.merge(partials))
@@ -0,0 +1,102 @@
+import logging
+import os
+import re
+from collections import namedtuple
+
+from tabsus.conversion.cnv import CnvConversionFile
+from tabsus.tabulation import _as_list, _resolve
+
+UF_CODES = {
+    'RO': '11', 'AC': '12', 'AM': '13', 'RR': '14', 'PA': '15', 'AP': '16', 'TO': '17',
+    'MA': '21', 'PI': '22', 'CE': '23', 'RN': '24', 'PB': '25', 'PE': '26', 'AL': '27', 'SE': '28', 'BA': '29',
+    'MG': '31', 'ES': '32', 'RJ': '33', 'SP': '35',
+    'PR': '41', 'SC': '42', 'RS': '43',
+    'MS': '50', 'MT': '51', 'GO': '52', 'DF': '53'
+}
+
+# Value shared by all records of a file: the record field, the starting position in the field and a function
+# converting the value in the file name to the value in the records (None if they are the same)
+PartitionKey = namedtuple('PartitionKey', ['field', 'start', 'convert'])
+
+
+class FilePartitioning:
+    """
+    Derives partition keys from file names, i.e. values of record fields that are the same in all the records of a
+    file (e.g. the state and the period in RDSP2008.DBC), so that files that can't contain records matching the
+    selection filters can be skipped without being opened.
+    """
+
+    def __init__(self, pattern, keys):
+        """
+        :param pattern: regular expression matched against the file name, with a named group for each key
+        :param keys: dictionary mapping each group name to a list of PartitionKeys
+        """
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.keys = keys
+
+    def partition(self, path):
+        """Returns a dictionary mapping (field, start) to the value of the field in all records of the file"""
+        match = self.pattern.match(os.path.basename(os.fspath(path)))
+        if not match:
+            return {}
+
+        partition = {}
+        for group, keys in self.keys.items():
+            value = match.group(group)
+            for key in keys:
+                key_value = key.convert(value.upper()) if key.convert else value
+                if key_value:
+                    partition[(key.field.casefold(), key.start)] = key_value
+
+        return partition
+
+    def prune(self, files, def_access, filters):
+        """
+        Returns the files which may contain records matching the filters
+        :param files: list of file paths
+        :param def_access: a DefFileAccess, used to load the conversion files of the selections
+        :param filters: dictionary mapping selection variables (or names) to the accepted categories
+        """
+        selections = [(_resolve(def_access.selections, s), accepted) for s, accepted in (filters or {}).items()]
+
+        result = []
+        for file in files:
+            partition = self.partition(file)
+            if all(self._may_match(partition, def_access, s, a) for s, a in selections):
+                result.append(file)
+            else:
+                logging.debug(f"Skipping {file}, no records can match the selections")
+
+        return result
+
+    @staticmethod
+    def _may_match(partition, def_access, selection, accepted):
+        value = partition.get((selection.field.casefold(), selection.start))
+        if value is None:
+            return True
+
+        cnv_file = def_access.get_cnv(selection)
+        if not isinstance(cnv_file, CnvConversionFile):
+            return True
+
+        accepted = set(_as_list(accepted))
+        prefix = value[:cnv_file.length]
+        for category in cnv_file.get_categories(selection):
+            if category.description in accepted and any(_has_prefix(v, prefix) for v in category.values):
+                return True
+
+        return False
+
+
+def _has_prefix(category_value, prefix):
+    """Whether there is a code in category_value (a single value or a range) starting with prefix"""
+    start = category_value.start.strip()[:len(prefix)]
+    end = category_value.end.strip()[:len(prefix)]
+    return start <= prefix <= end
+
+
+# DATASUS files named <type><UF><YYMM>.<ext>, e.g. RDSP2008.DBC: SIH AIHs from São Paulo hospitals, 2020-08
+DATASUS_PARTITIONING = FilePartitioning(r'^[A-Z]{2}(?P<uf>[A-Z]{2})(?P<period>\d{4})\.', {
+    'uf': [PartitionKey('MUNIC_MOV', 0, UF_CODES.get), PartitionKey('PA_UFMUN', 0, UF_CODES.get)],
+    'period': [PartitionKey('ANO_CMPT', 2, None), PartitionKey('PA_CMP', 2, None)]
+})
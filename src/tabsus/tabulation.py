@@ -0,0 +1,200 @@
+import pandas
+
+from tabsus import instrumentation
+from tabsus.conversion import sort_key
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    else:
+        return [value]
+
+
+def _resolve(variables, variable):
+    if isinstance(variable, str):
+        variable = variables[variable]
+
+    return getattr(variable, 'def_var', variable)
+
+
+class Tabulation:
+    """
+    Crosstab of records over DEF dimensions, like the tables produced by TabWin.
+
+    Records are grouped by the raw codes of the row/column dimensions and the increment is summed for each group
+    (or the records are counted when there is no increment). Only the distinct group keys are then converted to
+    categories, so no decoded column is materialized for the records. Filters restrict the records to the given
+    categories of selection variables, and are also evaluated once per distinct code.
+
+    The aggregation is split in aggregate() (partial result indexed by raw codes), merge() (combines partial
+    results) and finalize() (converts the codes to categories and builds the table).
+
+    With subtotals, the codes of dimensions with subtotal lines in the CNV file (e.g. the regions above the UFs
+    of REGUF.CNV) are converted to their most detailed lines, and the table also has a row (or
+    column) for each subtotal line, the sum of the lines below it. The subtotals are rolled up from the partial
+    result, through the mapping of lines to subtotal lines of the CNV file, so the records are aggregated once.
+    """
+
+    def __init__(self, context, rows=None, columns=None, increment=None, filters=None, subtotals=False):
+        self.context = context
+        self.rows = [_resolve(context.rows, v) for v in _as_list(rows)]
+        self.columns = [_resolve(context.columns, v) for v in _as_list(columns)]
+        self.increment = _resolve(context.increments, increment) if increment is not None else None
+        self.filters = [(_resolve(context.selections, k), set(_as_list(v))) for k, v in (filters or {}).items()]
+        self.subtotals = subtotals
+
+        if not self.rows and not self.columns:
+            raise ValueError("At least one row or column variable is required")
+
+    def __call__(self, df):
+        return self.finalize(self.aggregate(df))
+
+    @property
+    def dimensions(self):
+        return self.rows + self.columns
+
+    @property
+    def variables(self):
+        """All variables read by the tabulation"""
+        return self.dimensions + ([self.increment] if self.increment else []) + [s for s, _ in self.filters]
+
+    @property
+    def value_name(self):
+        return self.increment.name if self.increment else 'Frequência'
+
+    def aggregate(self, df):
+        """Sums the increment of df grouped by the raw codes of each dimension"""
+        with instrumentation.span('aggregate', rows=len(df)):
+            return self._aggregate(df)
+
+    def _aggregate(self, df):
+        keys = {i: self.context.get_code(dim, df) for i, dim in enumerate(self.dimensions)}
+
+        # records may also be other tables (e.g. DbfTables), whose values are arrays without index
+        frame = pandas.DataFrame(keys, index=getattr(df, 'index', None))
+        if self.increment:
+            frame['value'] = pandas.to_numeric(self.context.get_value(self.increment, df), errors='coerce')
+        else:
+            frame['value'] = 1
+
+        mask = self.select(df)
+        if mask is not None:
+            frame = frame[mask]
+
+        partial = frame.groupby(list(keys.keys()), dropna=False, sort=False, observed=True)['value'].sum()
+        return partial.rename_axis([d.name for d in self.dimensions])
+
+    def select(self, df):
+        """Returns the boolean mask of the records matching all filters, or None when there are no filters"""
+        mask = None
+        for selection, accepted in self.filters:
+            cnv_file = self.context.get_cnv(selection)
+
+            def is_selected(value):
+                category = cnv_file.find_category(selection, value)
+                return category is not None and category.description in accepted
+
+            codes = self.context.get_code(selection, df)
+            selected = self.context.record_access.map(codes, is_selected).astype(bool)
+            mask = selected if mask is None else mask & selected
+
+        return mask
+
+    def merge(self, partials):
+        """Combines partial results returned by aggregate()"""
+        levels = list(range(len(self.dimensions)))
+        names = [d.name for d in self.dimensions]
+        partial = pandas.concat(partials).groupby(level=levels, dropna=False, sort=False, observed=True).sum()
+        return partial.rename_axis(names)
+
+    def finalize(self, partial):
+        """Converts the raw codes of a partial result to categories, returning the table as a DataFrame"""
+        codes = [partial.index.get_level_values(i) for i in range(len(self.dimensions))]
+        categories = [self.categorize(dim, c) for dim, c in zip(self.dimensions, codes)]
+        values = partial.to_numpy()
+
+        rolled_up = []
+        if self.subtotals:
+            for i, dim in enumerate(self.dimensions):
+                subtotals = getattr(self.context.get_cnv(dim), 'subtotals', None)
+                if subtotals:
+                    categories, values = self.roll_up(i, subtotals, categories, values)
+                    rolled_up.append(i)
+
+        # The lines of the rolled up dimensions are grouped by order, as a line may have the description of its
+        # subtotal line, and only labeled after the grouping. They are grouped by the levels of an index, as a list of
+        # keys may be taken as a single key (e.g. when there are as many entries as dimensions)
+        keys = [self.order(c) if i in rolled_up else self.decode(c) for i, c in enumerate(categories)]
+        index = pandas.MultiIndex.from_arrays(keys, names=[d.name for d in self.dimensions])
+        result = pandas.Series(values, index=index).groupby(level=list(range(len(keys))), observed=True).sum()
+
+        if not self.rows:
+            result = result.to_frame(self.value_name).T
+        elif self.columns:
+            column_levels = list(range(len(self.rows), len(self.dimensions)))
+            result = result.unstack(level=column_levels, fill_value=0)
+        else:
+            result = result.to_frame(self.value_name)
+
+        if rolled_up:
+            labels = {self.dimensions[i].name: {int(c.order): c.description for c in categories[i] if c}
+                      for i in rolled_up}
+            result.index = self.relabel(result.index, labels)
+            result.columns = self.relabel(result.columns, labels)
+
+        return result
+
+    def categorize(self, dimension, codes):
+        """Converts the codes to categories of dimension (to their most detailed lines, with subtotals)"""
+        cnv_file = self.context.get_cnv(dimension)
+        find = cnv_file.find_detail if self.subtotals and getattr(cnv_file, 'subtotals', None) else \
+            cnv_file.find_category
+
+        return list(self.context.record_access.map(pandas.Series(codes), lambda value: find(dimension, value)))
+
+    @staticmethod
+    def roll_up(i, subtotals, categories, values):
+        """
+        Adds an entry for each subtotal line above the categories of dimension i, with the values of the entries
+        (entries without category are dropped, as they are by the grouping)
+        :param subtotals: dictionary mapping lines to the line of their subtotal
+        :param categories: list with the categories of the entries for each dimension
+        :param values: array with the value of each entry
+        """
+        entries = []
+        rolled_up = []
+        for entry, category in enumerate(categories[i]):
+            while category is not None:
+                entries.append(entry)
+                rolled_up.append(category)
+                category = subtotals.get(category)
+
+        categories = [rolled_up if d == i else [c[e] for e in entries] for d, c in enumerate(categories)]
+        return categories, values[entries]
+
+    @staticmethod
+    def decode(categories):
+        """Converts categories to their descriptions, sorted by the conversion file order"""
+        order = {}
+        for category in categories:
+            if category:
+                order.setdefault(category.description, sort_key(category))
+
+        labels = [c.description if c else None for c in categories]
+        return pandas.Categorical(labels, categories=sorted(order, key=order.get))
+
+    @staticmethod
+    def order(lines):
+        """Converts CNV lines to their orders, sorted"""
+        orders = [int(c.order) if c else None for c in lines]
+        return pandas.Categorical(orders, categories=sorted({o for o in orders if o is not None}))
+
+    @staticmethod
+    def relabel(index, labels):
+        """Replaces the orders in the levels of index named in labels by the descriptions mapped to them"""
+        levels = [index.get_level_values(i) for i in range(index.nlevels)]
+        levels = [level.map(labels[level.name]) if level.name in labels else level for level in levels]
+        return pandas.MultiIndex.from_arrays(levels, names=index.names) if index.nlevels > 1 else levels[0]
@@ -3,15 +3,18 @@ import zipfile
 import logging
 
 import urllib.parse
-import urllib.request
 from io import TextIOWrapper
 
+import nocasedict
+
 import tabsus
 
+from tabsus.bundle import BUNDLE_EXT, BundleConversionLoader, TabBundle, bundle_version, is_bundle, write_bundle
+from tabsus.conversion.cache import CACHE_VERSION
 from tabsus.conversion.loader import ConversionLoader
 from tabsus.definition.access import DefFileAccess
 from tabsus.definition.parser import DefParser
-from tabsus.file_loader import FileLoader
+from tabsus.file_loader import FileLoader, unix_path
 
 
 def open_def(file):
@@ -21,23 +24,50 @@ def open_def(file):
 
 
 class TabSus:
-    def __init__(self, root, encoding=tabsus.DEFAULT_ENCODING):
+    def __init__(self, root, encoding=tabsus.DEFAULT_ENCODING, cache=None, max_entries=None, max_bytes=None):
+        """
+        :param root: directory or zip file with the DEF and conversion files, or a bundle written by compile()
+        :param encoding: encoding of the DEF and conversion files
+        :param cache: persistent cache of the parsed conversion files, see ConversionLoader (disabled by default,
+        True for a cache in the default directory)
+        :param max_entries: maximum number of parsed conversion files kept in memory, None for no limit
+        :param max_bytes: maximum estimated size of the parsed conversion files kept in memory, None for no limit
+        """
         self.root = root
         self.encoding = encoding
-        self.file_loader = FileLoader.open(root)
-        self.cnv_loader = ConversionLoader(self.file_loader, encoding)
+
+        if is_bundle(root):
+            self.bundle = TabBundle(root)
+            self.file_loader = None
+            self.cnv_loader = BundleConversionLoader(self.bundle, max_entries=max_entries, max_bytes=max_bytes)
+        else:
+            self.bundle = None
+            self.file_loader = FileLoader.open(root)
+            self.cnv_loader = ConversionLoader(self.file_loader, encoding, cache or None, max_entries, max_bytes)
 
     def __str__(self):
         return os.path.basename(self.root)
 
     @property
     def definitions(self):
+        if self.bundle:
+            return list(self.bundle.definitions.keys())
+
         return self.file_loader.list_files('*.DEF')
 
     def __getitem__(self, key):
         return self.load_def(key)
 
     def load_def(self, path):
+        definition = self.parse_def(path)
+        return DefFileAccess(definition, self.cnv_loader) if definition else None
+
+    def parse_def(self, path):
+        """Returns the DefFile of path (the '.def' extension is optional), or None if it doesn't exist"""
+        if self.bundle:
+            definitions = self.bundle.definitions
+            return definitions.get(path) or definitions.get(path + '.def')
+
         def_resource = self.file_loader.load(path)
         if not def_resource and not path.lower().endswith('.def'):
             def_resource = self.file_loader.load(path + '.def')
@@ -46,12 +76,43 @@ class TabSus:
             with def_resource.open() as file:
                 text = TextIOWrapper(file, self.encoding, line_buffering=True)
                 parser = DefParser(text, os.path.basename(def_resource))
-                definition = parser.parse()
-
-            return DefFileAccess(definition, self.cnv_loader)
+                return parser.parse()
 
         return None
 
+    def compile(self, path=None):
+        """
+        Writes a bundle with all the DEF files of the archive and the conversion files they use, already parsed.
+        Opening the bundle with TabSus(path) doesn't parse any file.
+        :param path: path of the bundle, by default the archive path with the extension .tabsus
+        :return: the path of the bundle
+        """
+        if self.bundle:
+            raise ValueError(f"{self.root} is already a bundle")
+
+        path = path or os.path.splitext(os.path.normpath(self.root))[0] + BUNDLE_EXT
+
+        definitions = {}
+        cnv_files = nocasedict.NocaseDict()
+        for def_path in self.definitions:
+            try:
+                definition = self.parse_def(def_path)
+            except Exception as e:
+                logging.warning(f"Ignoring {def_path}: {e}")
+                continue
+
+            definitions[def_path] = definition
+            for variable in definition.variables:
+                cnv_filename = unix_path(getattr(variable, 'cnv_filename', None) or '')
+                if cnv_filename and cnv_filename not in cnv_files:
+                    try:
+                        cnv_files[cnv_filename] = self.cnv_loader.get(cnv_filename)
+                    except Exception as e:
+                        logging.warning(f"Ignoring {cnv_filename} of {def_path}: {e}")
+
+        write_bundle(path, self.encoding, definitions, cnv_files)
+        return path
+
 
 class Database:
     def __init__(self, name, tab_url):
@@ -66,7 +127,27 @@ class Database:
     def tabsus(self):
         return self.get_tabsus()
 
-    def get_tabsus(self):
+    def compile(self):
+        """Compiles the TAB archive to a bundle in tabsus.DOWNLOAD_PATH, used by get_tabsus() from then on"""
+        return self.get_tabsus(False).compile(self.bundle_path)
+
+    @property
+    def bundle_path(self):
+        return os.path.join(tabsus.DOWNLOAD_PATH, f"{self.name}{BUNDLE_EXT}")
+
+    def get_tabsus(self, bundle=True):
+        """
+        Returns the TabSus of the database, downloading the TAB archive if needed
+        :param bundle: whether to open the compiled bundle, if it exists. A bundle compiled by an incompatible version
+        is compiled again
+        """
+        if bundle and is_bundle(self.bundle_path):
+            if bundle_version(self.bundle_path) != CACHE_VERSION:
+                logging.info(f"Compiling {self.bundle_path} again, it was compiled by an incompatible version")
+                self.compile()
+
+            return TabSus(self.bundle_path)
+
         filename = os.path.join(tabsus.DOWNLOAD_PATH, f"{self.name}.zip")
 
         if not self.file_path:
@@ -74,6 +155,7 @@ class Database:
                 self.file_path = os.path.abspath(filename)
             else:
                 os.makedirs(os.path.dirname(filename), exist_ok=True)
+                import urllib.request
                 urllib.request.urlretrieve(self.tab_url.geturl(), filename)
                 self.file_path = os.path.abspath(filename)
 
@@ -82,7 +164,7 @@ class Database:
         except zipfile.BadZipFile as e:
             logging.warning(f"Incomplete or invalid file {e}")
             os.remove(self.file_path)
-            return self.get_tabsus()
+            return self.get_tabsus(bundle)
 
 
 DATABASES = [
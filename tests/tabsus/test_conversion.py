@@ -1,8 +1,12 @@
+import io
 import os.path
 from unittest import TestCase
 
+import numpy
+
 import tabsus
 from tabsus.conversion.cnv import CnvParser
+from tabsus.conversion.cnv.lookup import CnvArrayIndex, CnvHashIndex
 
 
 class TestCnvParser(TestCase):
@@ -89,6 +93,127 @@ class TestCnvParser(TestCase):
         self.assertEqual('K01   Dentes inclusos e impactados', cnv.lookup['K012'].description)
         self.assertEqual('K01   Dentes inclusos e impactados', cnv.lookup['K019'].description)
 
+    def test_overlapping_ranges(self):
+        lines = ['     3  2',
+                 f"{'':3}{'3':>4} {'Todos':52}00-99",
+                 f"{'':3}{'1':>4} {'Quinze':52}15",
+                 f"{'':3}{'2':>4} {'Dez a dezenove':52}10-19"]
+        file = io.TextIOWrapper(io.BytesIO('\r\n'.join(lines).encode(tabsus.DEFAULT_ENCODING)),
+                                tabsus.DEFAULT_ENCODING)
+        cnv = CnvParser(file, 'TESTE.CNV').parse()
+
+        codes = ['09', '10', '14', '15', '16', '19', '20', '99', 'AB']
+        expected = ['Todos', 'Dez a dezenove', 'Dez a dezenove', 'Quinze', 'Dez a dezenove', 'Dez a dezenove',
+                    'Todos', 'Todos', None]
+        self.assertEqual(expected, [c.description if c else None for c in map(cnv.lookup.__getitem__, codes)])
+        self.assertEqual(expected, [cnv.categories[p].description if p >= 0 else None
+                                    for p in cnv.lookup_many(None, codes)])
+
+    def test_repeated_categories(self):
+        lines = ['     2  2',
+                 f"{'':3}{'1':>4} {'Um':52}01, ,;comment",
+                 f"{'':3}{'1':>4} {'Um':52}02-04",
+                 f"\t{'2':>6} {'Dois':52}05",
+                 f"{'':3}{'1':>4} {'Um e cinco':52}05"]
+        file = io.TextIOWrapper(io.BytesIO('\r\n'.join(lines).encode(tabsus.DEFAULT_ENCODING)),
+                                tabsus.DEFAULT_ENCODING)
+        with self.assertLogs(level='WARNING'):
+            cnv = CnvParser(file, 'TESTE.CNV').parse()
+
+        # the values of all lines of an order, the description of the last one
+        um, dois = cnv.categories
+        self.assertEqual('Um e cinco', um.description)
+        self.assertEqual([('01', '01'), (' ', ' '), ('02', '04'), ('05', '05')], [(v.start, v.end) for v in um.values])
+        self.assertTrue(um.has_empty)
+        self.assertEqual('Dois', dois.description)
+        self.assertEqual('Um e cinco', cnv.lookup['05'].description)
+
+    def test_repeated_categories_empty_value(self):
+        lines = ['     3  2',
+                 f"{'':3}{'1':>4} {'Um':52}01,",
+                 f"{'':3}{'1':>4} {'Um':52}02",
+                 f"{'':3}{'2':>4} {'Dois':52}03,  ",
+                 f"{'':3}{'2':>4} {'Dois':52}04",
+                 f"{'':3}{'3':>4} {'Tres':52}05,  ,",
+                 f"{'':3}{'3':>4} {'Tres':52}06"]
+        file = io.TextIOWrapper(io.BytesIO('\r\n'.join(lines).encode(tabsus.DEFAULT_ENCODING)),
+                                tabsus.DEFAULT_ENCODING)
+        cnv = CnvParser(file, 'TESTE.CNV').parse()
+
+        # only a blank value, in any line of the order, matches empty values (missing values don't)
+        um, dois, tres = cnv.categories
+        self.assertEqual([False, False, True], [c.has_empty for c in cnv.categories])
+        self.assertEqual(['01', '02'], [v.value for v in um.values])
+        self.assertEqual(['03', '04'], [v.value for v in dois.values])
+        self.assertIs(tres, cnv.find_category(None, ''))
+
+    def test_subtotals(self):
+        with open(os.path.join(self.cnv_dir, 'REGUF.CNV'), encoding=tabsus.DEFAULT_ENCODING) as file:
+            cnv = CnvParser(file).parse()
+
+        # the categories are the lines without subtotal, the UFs map to the line of their region
+        self.assertEqual(['Região Norte', 'Região Nordeste'], [c.description for c in cnv.categories[:2]])
+        self.assertEqual(33, len(cnv.lines))
+        self.assertEqual(27, len(cnv.subtotals))
+
+        acre = cnv.find_detail(None, '12')
+        self.assertEqual('.. Acre', acre.description)
+        self.assertEqual('Região Norte', cnv.subtotals[acre].description)
+        self.assertIsNone(cnv.find_category(None, '12'))
+        self.assertIsNone(cnv.find_detail(None, '99'))
+
+    def test_long_lines(self):
+        with open(os.path.join(self.cnv_dir, 'BRUFMUNIC.CNV'), encoding=tabsus.DEFAULT_ENCODING) as file:
+            cnv = CnvParser(file).parse()
+
+        # the values of long lines (N format) start after the 102 columns of the description
+        rondonia, acre = cnv.categories[:2]
+        self.assertEqual([('110000', '119999')], [(v.start, v.end) for v in rondonia.values])
+        self.assertEqual('Acre', cnv.find_category(None, '120001').description)
+        self.assertEqual('.. Acrelândia', cnv.find_detail(None, '120001').description)
+        self.assertEqual(acre, cnv.subtotals[cnv.find_detail(None, '120001')])
+        positions = cnv.lookup_many(None, ['110001', '120001', '999999'])
+        self.assertEqual(['Rondônia', 'Acre', 'Ignorado ou exterior'],
+                         [cnv.categories[p].description for p in positions])
+
+    def test_lookup_strategy(self):
+        with open(os.path.join(self.cnv_dir, 'MUNICBRG.CNV'), encoding=tabsus.DEFAULT_ENCODING) as file:
+            municipalities = CnvParser(file).parse()
+
+        # 6 digits numeric codes use a dense table of small ints
+        self.assertIsInstance(municipalities.lookup, CnvArrayIndex)
+        self.assertEqual(numpy.int16, municipalities.lookup.indexes.dtype)
+        self.assertEqual('355030 São Paulo', municipalities.lookup['355030'].description)
+
+        # only codes with the length of the file match, as with the other lookups
+        self.assertIsNone(municipalities.lookup['0355030'])
+        self.assertIsNone(municipalities.lookup['55030'])
+        self.assertEqual(['355030 São Paulo', None, None],
+                         [municipalities.categories[p].description if p >= 0 else None
+                          for p in municipalities.lookup_many(None, ['355030', '0355030', '55030'])])
+
+        with open(os.path.join(self.cnv_dir, 'CID10_3D.CNV'), encoding=tabsus.DEFAULT_ENCODING) as file:
+            cid10 = CnvParser(file).parse()
+
+        self.assertIsInstance(cid10.lookup, CnvHashIndex)
+        self.assertEqual('A00   Colera', cid10.lookup['A00'].description)
+        self.assertEqual(['A00   Colera', None], [cid10.categories[p].description if p >= 0 else None
+                                                 for p in cid10.lookup_many(None, ['A00', 'ABC'])])
+
+    def test_lookup_many(self):
+        for name in ['SEXO.CNV', 'PERM.CNV', 'SAIDAPERMc.CNV', 'ANOv2.CNV', 'CIDX11.CNV']:
+            with open(os.path.join(self.cnv_dir, name), encoding=tabsus.DEFAULT_ENCODING) as file:
+                cnv = CnvParser(file).parse()
+
+            codes = [v.start for c in cnv.categories for v in c.values] + ['', None, '9999', '0050']
+            codes = [c[:cnv.length] if c else c for c in codes]
+
+            positions = cnv.lookup_many(None, codes)
+            expected = [cnv.find_category(None, c) for c in codes]
+            self.assertEqual(expected, [cnv.categories[p] if p >= 0 else None for p in positions], name)
+
+        self.assertEqual([-1], list(cnv.lookup_many(None, ['ABCD'])))
+
     def test_tolerate_colon_at_start(self):
         path = os.path.join(tabsus.TEST_RESOURCE_DIR, 'Modoentr.cnv')
         with open(path, encoding=tabsus.DEFAULT_ENCODING) as file:
@@ -1,10 +1,19 @@
-from unittest import TestCase
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase, mock
+
+import numpy
 
 import tabsus
 from tabsus import TEST_RESOURCE_DIR
-from tabsus.conversion.cnv import CnvConversionFile
+from tabsus.conversion.cache import ConversionCache
+from tabsus.conversion.cnv import CnvConversionFile, CnvParser
 from tabsus.conversion.dbf import DbfConversionFile
 from tabsus.conversion.loader import ConversionLoader
+from tabsus.conversion.lru import LruCache, estimate_size
+from tabsus.definition.parser import DefParser
 from tabsus.file_loader import *
 
 
@@ -54,3 +63,158 @@ class TestConversionLoader(TestCase):
         cnv_loader = ConversionLoader(sih, tabsus.DEFAULT_ENCODING)
         with self.assertRaises(NotImplementedError):
             cnv_loader.load('Documentos/LEIAME.pdf')
+
+    def test_load_missing(self):
+        sih = os.path.join(TEST_RESOURCE_DIR, 'TAB_SIH.zip')
+
+        cnv_loader = ConversionLoader(sih, tabsus.DEFAULT_ENCODING)
+        with self.assertRaises(FileNotFoundError):
+            cnv_loader.load('cnv/missing.cnv')
+
+    def test_get_single_flight(self):
+        sih = os.path.join(TEST_RESOURCE_DIR, 'SIH')
+
+        cnv_loader = ConversionLoader(sih, tabsus.DEFAULT_ENCODING)
+        load = cnv_loader.load
+        calls = []
+
+        def slow_load(path):
+            calls.append(path)
+            time.sleep(0.1)
+            return load(path)
+
+        results = []
+        with mock.patch.object(cnv_loader, 'load', side_effect=slow_load):
+            threads = [threading.Thread(target=lambda: results.append(cnv_loader.get('cnv/regiao.cnv')))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(['cnv/regiao.cnv'], calls)
+        self.assertEqual(8, len(results))
+        self.assertTrue(all(cnv is results[0] for cnv in results))
+
+    def test_get_empty_file(self):
+        sih = os.path.join(TEST_RESOURCE_DIR, 'SIH')
+
+        # an empty DBF file is falsy, but it is loaded only once
+        cnv_loader = ConversionLoader(sih, tabsus.DEFAULT_ENCODING)
+        empty = DbfConversionFile('DBF/EMPTY.DBF', ['CODIGO', 'NOME'], [[], []])
+        with mock.patch.object(cnv_loader, 'load', return_value=empty) as load:
+            self.assertIs(empty, cnv_loader.get('DBF/EMPTY.DBF', ['CODIGO', 'NOME']))
+            self.assertIs(empty, cnv_loader.get('DBF/EMPTY.DBF', ['CODIGO', 'NOME']))
+
+        self.assertEqual(0, len(empty))
+        self.assertEqual(1, load.call_count)
+
+    def test_get_error(self):
+        sih = os.path.join(TEST_RESOURCE_DIR, 'SIH')
+
+        cnv_loader = ConversionLoader(sih, tabsus.DEFAULT_ENCODING)
+        with self.assertRaises(FileNotFoundError):
+            cnv_loader.get('cnv/missing.cnv')
+        with self.assertRaises(FileNotFoundError):
+            cnv_loader.get('cnv/missing.cnv')
+        self.assertEqual(0, len(cnv_loader.cnv_files))
+
+    def test_prefetch(self):
+        sih = os.path.join(TEST_RESOURCE_DIR, 'SIH')
+
+        with open(os.path.join(sih, 'RD2008.DEF'), encoding=tabsus.DEFAULT_ENCODING) as file:
+            rd2008 = DefParser(file).parse()
+
+        cnv_loader = ConversionLoader(sih, tabsus.DEFAULT_ENCODING)
+        paths = cnv_loader.prefetch(rd2008, max_workers=4)
+
+        self.assertTrue(paths)
+        self.assertEqual(len(paths), len(cnv_loader.cnv_files))
+        self.assertIn('CNV/REGIAO.CNV', cnv_loader.cnv_files)
+
+    def test_max_entries(self):
+        sih = os.path.join(TEST_RESOURCE_DIR, 'SIH')
+
+        cnv_loader = ConversionLoader(sih, tabsus.DEFAULT_ENCODING, max_entries=2)
+        cnv_loader.pin('cnv/regiao.cnv')
+        regiao = cnv_loader.get('cnv/regiao.cnv')
+        cnv_loader.get('cnv/uf.cnv')
+        cnv_loader.get('cnv/sexo.cnv')
+        cnv_loader.get('cnv/regiao.cnv')
+
+        self.assertEqual(['cnv/regiao.cnv', 'cnv/sexo.cnv'], sorted(cnv_loader.cnv_files))
+        self.assertIs(regiao, cnv_loader.get('CNV/REGIAO.CNV'))
+        self.assertEqual({'hits': 2, 'misses': 3, 'evictions': 1, 'entries': 2, 'bytes': 0, 'pinned': 1},
+                         cnv_loader.stats())
+
+
+class TestLruCache(TestCase):
+    def test_max_bytes(self):
+        cache = LruCache(max_bytes=100, sizeof=len)
+        cache['a'] = 'x' * 40
+        cache['B'] = 'x' * 40
+        self.assertEqual('x' * 40, cache.get('a'))
+
+        cache['c'] = 'x' * 40
+        self.assertEqual(['a', 'c'], list(cache))
+        self.assertEqual(80, cache.size)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 1, 'entries': 2, 'bytes': 80, 'pinned': 0},
+                         cache.stats())
+
+    def test_keep_last(self):
+        cache = LruCache(max_bytes=100, sizeof=len)
+        cache.pin('A')
+        cache['a'] = 'x' * 60
+        cache['b'] = 'x' * 60
+        cache['c'] = 'x' * 60
+        self.assertEqual(['a', 'c'], list(cache))
+
+        cache.unpin('a')
+        self.assertEqual(['c'], list(cache))
+
+    def test_estimate_size(self):
+        small = estimate_size({'key': ['value'] * 10})
+        large = estimate_size({'key': [str(i) for i in range(1000)]})
+        self.assertLess(small, large)
+        self.assertGreaterEqual(estimate_size(numpy.zeros(1000, dtype=numpy.int64)), 8000)
+
+
+class TestConversionCache(TestCase):
+    def test_cache_zip(self):
+        sih = os.path.join(TEST_RESOURCE_DIR, 'TAB_SIH.zip')
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cnv = ConversionLoader(sih, tabsus.DEFAULT_ENCODING, cache_dir).load('cnv/regiao.cnv')
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+
+            with mock.patch.object(CnvParser, 'parse', side_effect=AssertionError("parsed again")):
+                cached = ConversionLoader(sih, tabsus.DEFAULT_ENCODING, cache_dir).load('cnv/regiao.cnv')
+
+            self.assertIsInstance(cached, CnvConversionFile)
+            self.assertEqual([c.description for c in cnv.categories], [c.description for c in cached.categories])
+
+    def test_cache_invalidation(self):
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as cache_dir:
+            os.makedirs(os.path.join(root, 'CNV'))
+            path = os.path.join(root, 'CNV', 'TESTE.CNV')
+            shutil.copy(os.path.join(TEST_RESOURCE_DIR, 'SIH', 'CNV', 'REGIAO.CNV'), path)
+
+            cache = ConversionCache(cache_dir)
+            cnv = ConversionLoader(root, tabsus.DEFAULT_ENCODING, cache).load('cnv/teste.cnv')
+
+            with open(path, 'rb') as file:
+                contents = file.read()
+            with open(path, 'wb') as file:
+                file.write(contents.replace('Região Sul'.encode(tabsus.DEFAULT_ENCODING),
+                                            'Região SUL'.encode(tabsus.DEFAULT_ENCODING)))
+            os.utime(path, ns=(0, 0))
+
+            changed = ConversionLoader(root, tabsus.DEFAULT_ENCODING, cache).load('cnv/teste.cnv')
+            self.assertIn('Região Sul', [c.description for c in cnv.categories])
+            self.assertIn('Região SUL', [c.description for c in changed.categories])
+            # the entry of the previous contents is removed
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+
+            cache.clear()
+            self.assertEqual([], os.listdir(cache_dir))
@@ -1,5 +1,5 @@
 import os
-from unittest import TestCase
+from unittest import TestCase, mock
 
 import dbfread
 import pandas
@@ -7,7 +7,7 @@ import pandas
 import tabsus
 from tabsus import TEST_RESOURCE_DIR
 from tabsus import TabSus
-from tabsus.dataframe import DataFrameWrapper
+from tabsus.dataframe import DataFrameRecordAccess, DataFrameWrapper
 
 
 class TestDataFrameAccess(TestCase):
@@ -21,7 +21,7 @@ class TestDataFrameAccess(TestCase):
 
         rd2008 = DataFrameWrapper(sih.load_def('rd2008.def'), df)
 
-        self.assertTrue(df['DT_INTER'].str[0:4].equals(rd2008['Ano de internação']))
+        self.assertTrue(df['DT_INTER'].str[0:4].equals(rd2008['Ano de internação'].astype(str)))
 
     def test_mapping_sexo(self):
         sih = os.path.join(tabsus.TEST_RESOURCE_DIR, 'SIH')
@@ -49,3 +49,66 @@ class TestDataFrameAccess(TestCase):
         rdtab = df.tabsus(rd2008)
 
         print(rdtab['Idade detalhada'])
+
+    def test_vectorized_mapping(self):
+        sih = os.path.join(tabsus.TEST_RESOURCE_DIR, 'SIH')
+        sih = TabSus(sih)
+        rd2008 = sih.load_def('rd2008.def')
+
+        dbf = dbfread.DBF(os.path.join(TEST_RESOURCE_DIR, 'teste.dbf'), encoding='Windows-1252')
+        df = pandas.DataFrame(dbf)
+
+        vectorized = DataFrameWrapper(rd2008, df)
+        per_row = DataFrameWrapper(rd2008, df, vectorized=False)
+
+        names = ['Sexo', 'Idade detalhada', 'Município internação', 'Ano/Mês processamento']
+        for name in names:
+            self.assertEqual(list(per_row[name]), list(vectorized[name]))
+
+        # transform_many also converts row by row when not vectorized
+        with mock.patch.object(per_row.def_access.record_access, 'factorize', side_effect=AssertionError):
+            transformed = per_row.transform_many(names)
+
+        expected = vectorized.transform_many(names)
+        for name in names:
+            self.assertEqual(list(expected[name]), list(transformed[name]))
+
+    def test_extract_range_with_missing_values(self):
+        df = pandas.DataFrame({'A': ['1', None, '3'], 'B': ['45', '67', '89']})
+        record_access = DataFrameRecordAccess(list(df.columns))
+
+        # the following field is read even if a value of the first one is missing
+        values = record_access.extract_range(df, 'A', 0, 3)
+        self.assertEqual(['145', '389'], [values[0], values[2]])
+        self.assertTrue(pandas.isna(values[1]))
+
+    def test_categorical_mapping(self):
+        sih = TabSus(os.path.join(tabsus.TEST_RESOURCE_DIR, 'SIH'))
+        rd2008 = sih.load_def('rd2008.def')
+
+        dbf = dbfread.DBF(os.path.join(TEST_RESOURCE_DIR, 'teste.dbf'), encoding='Windows-1252')
+        df = pandas.DataFrame(dbf)
+
+        faixa = DataFrameWrapper(rd2008, df)['Faixa etária (9)']
+        self.assertIsInstance(faixa.dtype, pandas.CategoricalDtype)
+
+        # all the categories of the CNV, in the CNV order
+        cnv = rd2008.get_cnv(rd2008.rows['Faixa etária (9)'])
+        ordered = sorted(cnv.get_categories(None), key=lambda c: int(c.order))
+        self.assertEqual(list(dict.fromkeys(c.description for c in ordered)), list(faixa.cat.categories))
+
+    def test_transform_many(self):
+        sih = TabSus(os.path.join(tabsus.TEST_RESOURCE_DIR, 'SIH'))
+        rd2008 = sih.load_def('rd2008.def')
+
+        dbf = dbfread.DBF(os.path.join(TEST_RESOURCE_DIR, 'sample.dbf'), encoding='Windows-1252')
+        rdtab = DataFrameWrapper(rd2008, pandas.DataFrame(dbf))
+
+        # the first three variables read MUNIC_RES
+        variables = ['Município de Residência', 'Unid da Federação de Resid.', 'Região de Residência', 'Sexo',
+                     'Idade detalhada', 'Valor Total']
+        df = rdtab.transform_many(variables)
+
+        self.assertEqual(variables, list(df.columns))
+        for name in variables:
+            self.assertTrue(rdtab[name].equals(df[name]), name)
@@ -0,0 +1,68 @@
+import hashlib
+import importlib.util
+import io
+import os
+from unittest import TestCase, skipUnless
+
+import tabsus
+from tabsus import TEST_RESOURCE_DIR
+from tabsus import TabSus
+from tabsus.conversion.dbc import explode, open_dbc, DbcResource, DbcStream
+from tabsus.conversion.dbf import DbfTable, DbfReader
+from tabsus.file_loader import FileResource
+
+
+class TestDbc(TestCase):
+    def setUp(self):
+        self.dbc = os.path.join(TEST_RESOURCE_DIR, 'teste.dbc')
+        self.dbf = os.path.join(TEST_RESOURCE_DIR, 'teste.dbf')
+
+    def test_explode(self):
+        # example from the PKWare Data Compression Library documentation
+        imploded = bytes([0x00, 0x04, 0x82, 0x24, 0x25, 0x8f, 0x80, 0x7f])
+        self.assertEqual(b'AIAIAIAIAIAIA', b''.join(explode(io.BytesIO(imploded).read)))
+
+    def test_decompress(self):
+        with open(self.dbf, 'rb') as file:
+            expected = file.read()
+
+        with open_dbc(self.dbc) as file:
+            self.assertEqual(expected, file.read())
+
+        with DbcResource(FileResource(self.dbc)).open() as file:
+            self.assertEqual(expected, file.read())
+
+    def test_decompress_checksum(self):
+        # SHA-256 of teste.dbf, the file compressed in teste.dbc
+        with io.BufferedReader(DbcStream(open(self.dbc, 'rb'))) as file:
+            self.assertEqual('5702121d86a47c2ece8672ede8fc925cd368f40496018920c56a490cb05891dd',
+                             hashlib.sha256(file.read()).hexdigest())
+
+    @skipUnless(importlib.util.find_spec('datasus_dbc'), "datasus-dbc is not installed")
+    def test_decompress_datasus_dbc(self):
+        with io.BufferedReader(DbcStream(open(self.dbc, 'rb'))) as file:
+            expected = file.read()
+
+        with open_dbc(self.dbc) as file:
+            self.assertEqual(expected, file.read())
+
+    def test_dbf_table(self):
+        expected = DbfTable(self.dbf).to_dataframe()
+
+        self.assertTrue(expected.equals(DbfTable(self.dbc).to_dataframe()))
+        self.assertTrue(expected.equals(DbfTable(FileResource(self.dbc)).to_dataframe()))
+
+        chunks = list(DbfTable.iter_chunks(self.dbc, 10))
+        self.assertEqual([10, 10, 9], [len(c) for c in chunks])
+
+    def test_dbf_reader(self):
+        with open_dbc(self.dbc) as file:
+            records = list(DbfReader(file, tabsus.DEFAULT_ENCODING))
+
+        self.assertEqual(29, len(records))
+
+    def test_tabulate(self):
+        rd2008 = TabSus(os.path.join(TEST_RESOURCE_DIR, 'SIH')).load_def('rd2008.def')
+
+        expected = rd2008.tabulate(self.dbf, rows='Sexo', columns='Cor/raça')
+        self.assertTrue(expected.equals(rd2008.tabulate(self.dbc, rows='Sexo', columns='Cor/raça')))
@@ -1,10 +1,15 @@
 import os
 from unittest import TestCase
 
+import dbfread
+import numpy
+import pandas
+
 from tabsus.definition import DefDimension
 
 import tabsus
 from tabsus import TEST_RESOURCE_DIR
+from tabsus.conversion.dbf import DbfTable
 from tabsus.conversion.loader import ConversionLoader
 from tabsus.file_loader import ZipFileLoader
 
@@ -34,3 +39,108 @@ class TestDbfConversionFile(TestCase):
         self.assertIsNone(dbf.find_record('CD_COD', '1234'))
         self.assertIsNotNone(dbf.find_record('CD_COD', 'A000'))
         self.assertIsNotNone(dbf.find_record('', 'A000'))
+
+    def test_columns(self):
+        dbf = self.loader.load('DBF/cid10.dbf')
+        dimension = DefDimension('L', 'CID10', 'DIAG_PRINC', 'CD_DESCR', 'DBF/cid10.dbf')
+
+        self.assertEqual('CD_COD', dbf.fields[0])
+        self.assertEqual(len(dbf), len(dbf.columns['cd_descr']))
+        self.assertEqual(dbf.records[0], dbf.record(0))
+        self.assertEqual('A00.0 Colera dev Vibrio cholerae 01 biot cholerae',
+                         dbf.find_category(dimension, 'a000').description)
+
+        # categories and their order are built once for each description field
+        self.assertIs(dbf.get_categories(dimension), dbf.get_categories(dimension))
+        self.assertIs(dbf.get_category_order(dimension), dbf.get_category_order(dimension))
+        self.assertEqual(1, len(dbf.indexes))
+
+        descriptions, codes = dbf.get_category_order(dimension)
+        self.assertEqual([c.description for c in dbf.get_categories(dimension)], [descriptions[i] for i in codes])
+
+    def test_fields(self):
+        loader = ConversionLoader(os.path.join(TEST_RESOURCE_DIR, 'SIH'), tabsus.DEFAULT_ENCODING)
+        hospital = DefDimension('L', 'Hospital', 'CGC_HOSP', 'RAZAO', 'DBF/CADHOSP.DBF')
+
+        # only the key and description fields are read (and the first one, the default key)
+        dbf = loader.get('DBF/CADHOSP.DBF', hospital.conversion_fields)
+        self.assertEqual(['CGC_HOSP', 'RAZAO'], list(dbf.columns))
+        self.assertEqual(['CGC_HOSP', 'RAZAO', 'UF_ZI', 'CMPT'], dbf.dbf_fields)
+        self.assertTrue(dbf.has_fields(['cgc_hosp', 'razao', 'NOT_A_FIELD']))
+        self.assertFalse(dbf.has_fields())
+        self.assertIs(dbf, loader.get('DBF/CADHOSP.DBF', ['RAZAO']))
+
+        # other fields are read along with the fields requested before
+        uf = loader.get('DBF/CADHOSP.DBF', ['UF_ZI'])
+        self.assertEqual(['CGC_HOSP', 'RAZAO', 'UF_ZI'], list(uf.columns))
+        self.assertEqual(list(dbf.columns['RAZAO']), list(uf.columns['RAZAO']))
+        self.assertTrue(loader.get('DBF/CADHOSP.DBF').has_fields())
+
+    def test_lookup_many(self):
+        dbf = self.loader.load('DBF/cid10.dbf')
+        dimension = DefDimension('L', 'CID10', 'DIAG_PRINC', 'CD_DESCR', 'DBF/cid10.dbf')
+
+        positions = dbf.lookup_many(dimension, ['A000', 'a000', '1234', None, 'A000'])
+        categories = dbf.get_categories(dimension)
+        self.assertEqual(positions[0], positions[1])
+        self.assertEqual(positions[0], positions[4])
+        self.assertEqual([-1, -1], list(positions[2:4]))
+        self.assertEqual('A00.0 Colera dev Vibrio cholerae 01 biot cholerae', categories[positions[0]].description)
+
+
+class TestDbfTable(TestCase):
+    def setUp(self):
+        self.path = os.path.join(TEST_RESOURCE_DIR, 'sample.dbf')
+
+    def test_same_as_dbfread(self):
+        expected = pandas.DataFrame(dbfread.DBF(self.path, encoding=tabsus.DEFAULT_ENCODING))
+        df = DbfTable(self.path).to_dataframe()
+
+        self.assertEqual(list(expected.columns), list(df.columns))
+        for column in expected.columns:
+            self.assertEqual(expected[column].dtype, df[column].dtype, column)
+            self.assertTrue(expected[column].fillna(-1).equals(df[column].fillna(-1)), column)
+
+    def test_read_from_file_object(self):
+        with open(self.path, 'rb') as file:
+            table = DbfTable(file)
+
+        mapped = DbfTable(self.path)
+        self.assertEqual(len(mapped), len(table))
+        self.assertTrue((mapped.raw('MUNIC_MOV') == table.raw('munic_mov')).all())
+
+    def test_raw_values(self):
+        table = DbfTable(self.path)
+
+        self.assertEqual('S6', table.raw('MUNIC_MOV').dtype.str[1:])
+        self.assertEqual(table['DT_INTER'][0], table.raw('DT_INTER')[0].decode(tabsus.DEFAULT_ENCODING))
+
+    def test_iter_chunks(self):
+        table = DbfTable(self.path)
+
+        chunks = list(DbfTable.iter_chunks(self.path, 1000))
+        self.assertEqual([1000, 1000, 1000, len(table) - 3000], [len(c) for c in chunks])
+        self.assertEqual(list(table['N_AIH']), [v for c in chunks for v in c['N_AIH']])
+
+        with open(self.path, 'rb') as file:
+            chunks = list(DbfTable.iter_chunks(file, 1000))
+        self.assertEqual([1000, 1000, 1000, len(table) - 3000], [len(c) for c in chunks])
+        self.assertEqual(list(table['N_AIH']), [v for c in chunks for v in c['N_AIH']])
+
+    def test_raw_range(self):
+        table = DbfTable(self.path)
+
+        # COD_IDADE (1 byte) followed by IDADE (number, 2 bytes)
+        ages = table.raw_range('COD_IDADE', 0, 3)
+        self.assertEqual('S3', ages.dtype.str[1:])
+        self.assertTrue(numpy.shares_memory(ages, table.records))
+        self.assertTrue((ages == numpy.char.add(table.raw('COD_IDADE'), table.raw('IDADE'))).all())
+
+        # numbers are zero-filled
+        decoded = table.decode_range('COD_IDADE', 0, 3)
+        expected = [c + f"{i:02d}" for c, i in zip(table['COD_IDADE'], table['IDADE'])]
+        self.assertEqual(expected, list(decoded))
+
+        # ranges are limited to the record length
+        last = table.fields[-1]
+        self.assertEqual(f'S{last.length}', table.raw_range(last.name, 0, 100).dtype.str[1:])
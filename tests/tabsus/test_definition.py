@@ -1,5 +1,8 @@
 import os
-from unittest import TestCase
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, mock
 
 import dbfread
 import pandas
@@ -7,8 +10,11 @@ import pandas
 import tabsus
 from tabsus import TEST_RESOURCE_DIR
 from tabsus import TabSus
+from tabsus.bundle import HEADER, MAGIC, bundle_version
+from tabsus.conversion.cache import CACHE_VERSION
 from tabsus.definition.parser import DefParser
 from tabsus.definition.access import DictionaryRecordAccess
+from tabsus.wrapper import Database
 
 
 class TestTabSus(TestCase):
@@ -143,3 +149,89 @@ class TestTabSus(TestCase):
                             rd2008.rows['Ano/Mês internação'].cnv_filename)
         rd2008.get_cnv(rd2008.rows['Ano/Mês internação'])
         self.assertEqual(2, len(rd2008.cnv_loader.cnv_files))
+
+    def test_read_dbf_projection(self):
+        sih = TabSus(os.path.join(TEST_RESOURCE_DIR, 'SIH'))
+        rd2008 = sih.load_def('rd2008.def')
+
+        df = rd2008.read_dbf(os.path.join(TEST_RESOURCE_DIR, 'sample.dbf'), ['Idade detalhada', 'Sexo', 'Valor Total'])
+
+        # IDADE is read because 'Idade detalhada' values extend beyond COD_IDADE
+        self.assertEqual(['SEXO', 'VAL_TOT', 'COD_IDADE', 'IDADE'], list(df.columns))
+
+    def test_compile_bundle(self):
+        sih = TabSus(os.path.join(TEST_RESOURCE_DIR, 'TAB_SIH.zip'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = sih.compile(os.path.join(tmp, 'SIH.tabsus'))
+
+            bundle = TabSus(path)
+            self.assertIsNotNone(bundle.bundle)
+            self.assertEqual(sorted(sih.definitions), sorted(bundle.definitions))
+
+            rd2008 = bundle.load_def('rd2008')
+            self.assertEqual('RD2008.DEF - Movimento de AIH - Arquivos Reduzidos', str(rd2008))
+
+            expected = sih.load_def('rd2008')
+            variable = 'Município gestor'
+            self.assertEqual(expected.get_values(expected.rows[variable]), rd2008.get_values(rd2008.rows[variable]))
+            self.assertEqual(expected.rows[variable].transform({'UF_ZI': '355030'}),
+                             rd2008.rows[variable].transform({'UF_ZI': '355030'}))
+
+            bundle.bundle.close()
+
+    def test_stale_bundle(self):
+        database = Database('SIH', f"file://{os.path.abspath(os.path.join(TEST_RESOURCE_DIR, 'TAB_SIH.zip'))}")
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(tabsus, 'DOWNLOAD_PATH', tmp):
+            path = database.compile()
+
+            # a bundle compiled by another version is compiled again
+            with open(path, 'r+b') as file:
+                file.write(HEADER.pack(MAGIC, CACHE_VERSION - 1, 0))
+            self.assertRaises(ValueError, TabSus, path)
+
+            sih = database.get_tabsus()
+            self.assertIsNotNone(sih.bundle)
+            self.assertEqual(CACHE_VERSION, bundle_version(path))
+            self.assertEqual('RD2008.DEF - Movimento de AIH - Arquivos Reduzidos', str(sih.load_def('rd2008')))
+
+            sih.bundle.close()
+
+
+class TestLazyImports(TestCase):
+    def run_python(self, code):
+        src = os.path.join(os.path.dirname(tabsus.__file__), '..')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([src, os.environ.get('PYTHONPATH', '')]))
+        return subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True,
+                              check=True).stdout.split()
+
+    def test_parse_def_without_pandas(self):
+        code = f"""
+import sys
+import tabsus
+print('pandas' in sys.modules)
+rd2008 = tabsus.TabSus({os.path.join(TEST_RESOURCE_DIR, 'SIH')!r}, cache=None).load_def('RD2008.DEF')
+print(len(rd2008.variables) > 0, 'pandas' in sys.modules)
+"""
+        self.assertEqual(['False', 'True', 'False'], self.run_python(code))
+
+    def test_register_accessor(self):
+        code = f"""
+import pandas
+import tabsus
+print(hasattr(pandas.DataFrame(), 'tabsus'))
+tabsus.TabSus({os.path.join(TEST_RESOURCE_DIR, 'SIH')!r}, cache=None).load_def('RD2008.DEF')
+print(hasattr(pandas.DataFrame(), 'tabsus'))
+"""
+        self.assertEqual(['False', 'True'], self.run_python(code))
+
+    def test_register_accessor_on_pandas_import(self):
+        code = f"""
+import tabsus
+rd2008 = tabsus.TabSus({os.path.join(TEST_RESOURCE_DIR, 'SIH')!r}, cache=None)['RD2008']
+import pandas
+df = pandas.DataFrame({{'SEXO': ['1', '3']}})
+print(list(df.tabsus(rd2008)['Sexo']))
+"""
+        self.assertEqual(["['Masculino',", "'Feminino']"], self.run_python(code))
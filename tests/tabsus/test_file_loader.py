@@ -1,3 +1,4 @@
+import tempfile
 from unittest import TestCase
 
 from tabsus import TEST_RESOURCE_DIR
@@ -16,6 +17,11 @@ class TestLoadFile:
         self.assertIsNotNone(self.loader.load('cnv/regiao.cnv'))
         self.assertIsNone(self.loader.load('cnv/noneistent.cnv'))
 
+    def test_load_case_insensitive(self):
+        resource = self.loader.load('CNV\\ReGiaO.cnv')
+        self.assertIsNotNone(resource)
+        self.assertTrue(os.fspath(resource).endswith('REGIAO.CNV'))
+
     def test_list_files(self):        
         self.assertEqual(4, len(self.loader.list_files('*.DEF')))
         self.assertEqual(4, len(self.loader.list_files('*.def')))
@@ -33,6 +39,20 @@ class TestFileSystemLoader(TestCase, TestLoadFile):
         self.loader = FileSystemLoader(os.path.join(TEST_RESOURCE_DIR, 'SIH'))
 
 
+class TestFileSystemLoaderIndex(TestCase):
+    def test_refresh(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.mkdir(os.path.join(root, 'CNV'))
+            loader = FileSystemLoader(root)
+            self.assertIsNone(loader.load('cnv/teste.cnv'))
+
+            with open(os.path.join(root, 'CNV', 'TESTE.CNV'), 'w'):
+                pass
+
+            self.assertIsNotNone(loader.load('cnv/teste.cnv'))
+            self.assertEqual(['TESTE.CNV'], loader.list_files('*.cnv'))
+
+
 class TestResolvePath(TestCase):
     def test_resolve(self):
         sih = os.path.join(TEST_RESOURCE_DIR, 'SIH')
@@ -0,0 +1,54 @@
+import os
+from unittest import TestCase
+
+import dbfread
+import pandas
+
+import tabsus
+from tabsus import TEST_RESOURCE_DIR, TabSus, instrumentation
+from tabsus.dataframe import DataFrameWrapper
+
+
+class TestInstrumentation(TestCase):
+    def setUp(self):
+        self.sih = TabSus(os.path.join(TEST_RESOURCE_DIR, 'TAB_SIH.zip'), cache=None)
+        self.df = pandas.DataFrame(dbfread.DBF(os.path.join(TEST_RESOURCE_DIR, 'teste.dbf'),
+                                               encoding=tabsus.DEFAULT_ENCODING))
+
+    def test_disabled(self):
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertIsNone(instrumentation.get_stats())
+
+        with instrumentation.span('event') as span:
+            span.set(rows=1)
+
+    def test_stats(self):
+        rd2008 = self.sih.load_def('rd2008.def')
+
+        with instrumentation.instrument() as stats:
+            DataFrameWrapper(rd2008, self.df)['Sexo']
+            DataFrameWrapper(rd2008, self.df)['Sexo']
+
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertEqual(1, stats['cnv_miss']['count'])
+        self.assertEqual(1, stats['cnv_parse']['count'])
+        self.assertEqual(1, stats['file_read']['count'])
+        self.assertGreater(stats['cnv_hit']['count'], 0)
+        self.assertEqual(2, stats['transform']['count'])
+        self.assertEqual(2 * len(self.df), stats['transform']['rows'])
+        self.assertIn('cnv_parse', stats.report())
+
+    def test_hook(self):
+        rd2008 = self.sih.load_def('rd2008.def')
+
+        events = []
+        hook = lambda event, seconds, info: events.append((event, info))
+        instrumentation.add_hook(hook)
+        try:
+            rd2008.tabulate(self.df, rows='Sexo')
+        finally:
+            instrumentation.remove_hook(hook)
+
+        self.assertIn(('aggregate', {'rows': len(self.df)}), events)
+        self.assertIn('cnv_parse', [event for event, _ in events])
+        self.assertIsNone(instrumentation.get_stats())
@@ -0,0 +1,35 @@
+import os
+from unittest import TestCase
+
+from tabsus import TEST_RESOURCE_DIR
+from tabsus import TabSus
+from tabsus.partition import DATASUS_PARTITIONING
+
+
+class TestFilePartitioning(TestCase):
+    def setUp(self):
+        self.rd2008 = TabSus(os.path.join(TEST_RESOURCE_DIR, 'SIH')).load_def('rd2008.def')
+        self.files = ['RDSP2008.dbc', 'RDGO2008.dbc', 'RDGO2009.dbc', 'rdgo2108.DBC', 'RD.dbc']
+
+    def test_partition(self):
+        partition = DATASUS_PARTITIONING.partition('dados/RDSP2008.dbc')
+        self.assertEqual('35', partition[('munic_mov', 0)])
+        self.assertEqual('2008', partition[('ano_cmpt', 2)])
+
+        self.assertEqual({}, DATASUS_PARTITIONING.partition('RD.dbc'))
+
+    def test_prune_by_uf(self):
+        files = DATASUS_PARTITIONING.prune(self.files, self.rd2008, {'UF internação': 'Goiás'})
+        self.assertEqual(['RDGO2008.dbc', 'RDGO2009.dbc', 'rdgo2108.DBC', 'RD.dbc'], files)
+
+        files = DATASUS_PARTITIONING.prune(self.files, self.rd2008, {'Região internação': 'Região Sudeste'})
+        self.assertEqual(['RDSP2008.dbc', 'RD.dbc'], files)
+
+    def test_prune_by_period(self):
+        filters = {'UF internação': ['Goiás', 'São Paulo'], 'Ano/Mês processamento': '2020/Ago'}
+        files = DATASUS_PARTITIONING.prune(self.files, self.rd2008, filters)
+        self.assertEqual(['RDSP2008.dbc', 'RDGO2008.dbc', 'RD.dbc'], files)
+
+    def test_not_partitioned_selection(self):
+        files = DATASUS_PARTITIONING.prune(self.files, self.rd2008, {'Caráter atendimento': '02 Urgência'})
+        self.assertEqual(self.files, files)
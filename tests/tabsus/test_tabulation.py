@@ -0,0 +1,164 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import dbfread
+import pandas
+
+import tabsus
+from tabsus import TEST_RESOURCE_DIR
+from tabsus import TabSus
+from tabsus import parallel
+from tabsus.definition import DefDimension
+
+
+class TestTabulation(TestCase):
+    def setUp(self):
+        sih = TabSus(os.path.join(TEST_RESOURCE_DIR, 'SIH'))
+        self.rd2008 = sih.load_def('rd2008.def')
+
+        dbf = dbfread.DBF(os.path.join(TEST_RESOURCE_DIR, 'sample.dbf'), encoding=tabsus.DEFAULT_ENCODING)
+        self.df = pandas.DataFrame(dbf)
+
+    def test_count(self):
+        rdtab = self.df.tabsus(self.rd2008)
+        table = rdtab.tabulate(rows='Sexo')
+
+        # the categories are categorical, with all the categories of the CNV
+        expected = rdtab['Sexo'].value_counts()
+        expected = expected[expected > 0]
+        self.assertEqual(len(self.df), table['Frequência'].sum())
+        for sexo, count in expected.items():
+            self.assertEqual(count, table.loc[sexo, 'Frequência'])
+
+    def test_crosstab(self):
+        rdtab = self.df.tabsus(self.rd2008)
+        table = rdtab.tabulate(rows='Faixa etária (9)', columns='Sexo', increment='Valor Total')
+
+        expected = pandas.crosstab(rdtab['Faixa etária (9)'], rdtab['Sexo'], values=self.df['VAL_TOT'], aggfunc='sum')
+        for faixa in expected.index:
+            for sexo in expected.columns:
+                self.assertAlmostEqual(expected.loc[faixa, sexo], table.loc[faixa, sexo], places=2)
+
+        # categories are sorted in the CNV order
+        self.assertEqual('< 1      ano', table.index[0])
+
+    def test_as_many_groups_as_dimensions(self):
+        path = os.path.join(TEST_RESOURCE_DIR, 'sample.dbf')
+
+        # the records are all from the North region: 2 groups (by sex) of 2 dimensions
+        table = self.rd2008.tabulate(path, rows='Região internação', columns='Sexo')
+        self.assertEqual(['Região Norte'], list(table.index))
+        self.assertEqual(['Masculino', 'Feminino'], list(table.columns))
+        self.assertEqual(len(self.df), table.values.sum())
+
+        # a single group of a single dimension
+        table = self.rd2008.tabulate(path, rows='Região internação')
+        self.assertEqual(['Região Norte'], list(table.index))
+        self.assertEqual(len(self.df), table.loc['Região Norte', 'Frequência'])
+
+    def test_filters(self):
+        rdtab = self.df.tabsus(self.rd2008)
+        table = rdtab.tabulate(rows='Sexo', filters={'Caráter atendimento': '02 Urgência'})
+
+        urgencia = rdtab['Caráter atendimento'] == '02 Urgência'
+        expected = rdtab['Sexo'][urgencia].value_counts()
+        expected = expected[expected > 0]
+        for sexo, count in expected.items():
+            self.assertEqual(count, table.loc[sexo, 'Frequência'])
+
+    def test_subtotals(self):
+        rdtab = self.df.tabsus(self.rd2008)
+        table = rdtab.tabulate(rows='Região e UF internação', columns='Sexo', subtotals=True)
+
+        # the records are all from Acre, rolled up to its region
+        self.assertEqual(['Região Norte', '.. Acre'], list(table.index))
+        self.assertTrue(table.loc['Região Norte'].equals(table.loc['.. Acre']))
+        self.assertEqual(len(self.df), table.loc['Região Norte'].sum())
+
+        variable = 'Diagnóstico CID10 (grupo)'
+        expected = rdtab.tabulate(rows=variable)
+        table = rdtab.tabulate(rows=variable, subtotals=True)
+
+        # the lines without subtotal have the same totals, their lines are listed below them
+        for category in expected.index:
+            self.assertEqual(expected.loc[category, 'Frequência'], table.loc[category, 'Frequência'])
+        self.assertEqual(table.loc['Neoplasias malignas', 'Frequência'],
+                         table.loc['. Neoplasias malignas de localizações especificada', 'Frequência'])
+        self.assertEqual((self.df['DIAG_PRINC'].str[:3] == 'C50').sum(),
+                         table.loc['... Neoplasias malignas da mama', 'Frequência'])
+        self.assertEqual('. Neoplasias malignas de localizações especificada',
+                         table.index[list(table.index).index('Neoplasias malignas') + 1])
+
+        path = os.path.join(TEST_RESOURCE_DIR, 'sample.dbf')
+        self.assertTrue(table.equals(self.rd2008.tabulate(path, rows=variable, subtotals=True)))
+
+    def test_subtotals_with_same_description(self):
+        # in REG_SIGL.CNV, the line of code 00 has the description of its subtotal line
+        uf = DefDimension('L', 'UF', 'UF', '1', 'CNV\\REG_SIGL.CNV')
+        df = pandas.DataFrame({'UF': ['00'] * 5 + ['RO'] * 2, 'SEXO': ['1', '3'] * 3 + ['1']})
+        table = self.rd2008.tabulate(df, rows=uf, subtotals=True)
+
+        self.assertEqual(['Região Norte', '.. Rondônia', 'Ignorado/Exterior', 'Ignorado/Exterior'], list(table.index))
+        self.assertEqual([2, 2, 5, 5], list(table['Frequência']))
+
+        table = self.rd2008.tabulate(df, rows='Sexo', columns=uf, subtotals=True)
+        self.assertEqual([1, 1, 3, 3], list(table.loc['Masculino']))
+
+    def test_tabulate_records(self):
+        records = self.df.head(100).to_dict('records')
+        table = self.rd2008.tabulate(records, rows='Sexo', columns='Cor/raça')
+
+        self.assertEqual(100, table.values.sum())
+
+    def test_tabulate_dbf_file(self):
+        path = os.path.join(TEST_RESOURCE_DIR, 'sample.dbf')
+        table = self.rd2008.tabulate(path, rows='Idade detalhada', columns='Sexo', increment='Valor Total')
+        expected = self.df.tabsus(self.rd2008).tabulate(rows='Idade detalhada', columns='Sexo',
+                                                        increment='Valor Total')
+
+        self.assertTrue(expected.equals(table))
+
+    def test_tabulate_in_chunks(self):
+        path = os.path.join(TEST_RESOURCE_DIR, 'sample.dbf')
+        expected = self.rd2008.tabulate(path, rows='Idade detalhada', columns='Sexo')
+
+        table = self.rd2008.tabulate(path, rows='Idade detalhada', columns='Sexo', chunk_size=500)
+        self.assertTrue(expected.equals(table))
+
+        table = self.rd2008.tabulate([path, path], rows='Idade detalhada', columns='Sexo', chunk_size=1000)
+        self.assertTrue((expected * 2).equals(table))
+
+    def test_tabulate_in_parallel(self):
+        files = [os.path.join(TEST_RESOURCE_DIR, 'sample.dbf'), os.path.join(TEST_RESOURCE_DIR, 'teste.dbc')]
+        expected = self.rd2008.tabulate(files, rows='Idade detalhada', columns='Sexo')
+
+        table = self.rd2008.tabulate(files, rows='Idade detalhada', columns='Sexo', processes=2)
+        self.assertTrue(expected.equals(table))
+
+    def test_tabulate_in_spawned_processes(self):
+        files = [os.path.join(TEST_RESOURCE_DIR, 'teste.dbf'), os.path.join(TEST_RESOURCE_DIR, 'teste.dbc')]
+        expected = self.rd2008.tabulate(files, rows='Sexo', columns='Cor/raça')
+
+        # the workers rebuild the access from the pickled DEF file and conversion files
+        table = parallel.tabulate_files(self.rd2008, files, rows='Sexo', columns='Cor/raça', processes=2,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        self.assertTrue(expected.equals(table))
+
+    def test_tabulate_files(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            os.mkdir(os.path.join(data_dir, 'dados'))
+            for name in ['RDGO2101.dbc', 'rdgo2102.DBC', 'PAGO2101.dbc']:
+                shutil.copy(os.path.join(TEST_RESOURCE_DIR, 'teste.dbc'), os.path.join(data_dir, 'dados', name))
+
+            files = self.rd2008.find_files(data_dir)
+            self.assertEqual(['RDGO2101.dbc', 'rdgo2102.DBC'], [os.path.basename(f) for f in files])
+
+            table = self.rd2008.tabulate_files(data_dir, rows='Sexo', processes=2)
+            self.assertEqual(2 * 29, table['Frequência'].sum())
+
+            # the files are from Goiás, so they can't match São Paulo
+            self.assertEqual([], self.rd2008.find_files(data_dir, {'UF internação': 'São Paulo'}))
+            self.assertEqual(files, self.rd2008.find_files(data_dir, {'UF internação': 'Goiás'}))